@@ -28,6 +28,11 @@ class AttributeForm(ModelForm):
 		if value is not None:
 			self.value_fields = value.value_formfields()
 			self.fields.update(self.value_fields)
+		elif self.instance.pk is not None and self.instance.value_content_type_id is None:
+			# Otherwise, the value may be stored inline.
+			field = Attribute._meta.get_field('inline_value')
+			self.value_fields = {'value': field.formfield(initial=self.instance.inline_value_json, required=False)}
+			self.fields.update(self.value_fields)
 	
 	def save(self, *args, **kwargs):
 		# At this point, the cleaned_data has already been stored on self.instance.
@@ -44,6 +49,7 @@ class AttributeForm(ModelForm):
 			# know what fields to add.
 			if self.instance.value_content_type_id is not None:
 				self.instance.value = ContentType.objects.get_for_id(self.instance.value_content_type_id).model_class().objects.create()
+				self.instance.inline_value = None
 		elif self.instance.value is not None:
 			# The value content type is the same, but one of the value fields has changed.
 			
@@ -52,6 +58,9 @@ class AttributeForm(ModelForm):
 			if set(fields) & set(self.changed_data):
 				self.instance.value.construct_instance(**dict([(key, self.cleaned_data[key]) for key in fields]))
 				self.instance.value.save()
+		elif 'value' in self.fields and 'value' in self.changed_data:
+			# The value is stored inline and has changed.
+			self.instance.inline_value = self.cleaned_data['value']
 		
 		return super(AttributeForm, self).save(*args, **kwargs)
 	
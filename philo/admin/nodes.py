@@ -14,6 +14,9 @@ class NodeAdmin(TreeEntityAdmin):
 		'generic': [['view_content_type', 'view_object_id']]
 	}
 	
+	def queryset(self, request):
+		return super(NodeAdmin, self).queryset(request).prefetch_views()
+	
 	def accepts_subpath(self, obj):
 		return obj.accepts_subpath
 	accepts_subpath.boolean = True
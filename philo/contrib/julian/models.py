@@ -10,7 +10,6 @@ from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models.query import QuerySet
 from django.http import HttpResponse, Http404
 from django.utils.encoding import force_unicode
 from taggit.managers import TaggableManager
@@ -19,9 +18,9 @@ from philo.contrib.julian.feedgenerator import ICalendarFeed
 from philo.contrib.winer.models import FeedView
 from philo.contrib.winer.feeds import registry
 from philo.exceptions import ViewCanNotProvideSubpath
-from philo.models import Tag, Entity, Page
+from philo.models import Tag, Entity, EntityManager, EntityQuerySet, Page
 from philo.models.fields import TemplateField
-from philo.utils import ContentTypeRegistryLimiter
+from philo.utils import ContentTypeRegistryLimiter, fill_fk_caches, fill_gfk_caches, get_m2m_bulk
 
 
 __all__ = ('register_location_model', 'unregister_location_model', 'Location', 'TimedModel', 'Event', 'Calendar', 'CalendarView',)
@@ -93,11 +92,11 @@ class TimedModel(models.Model):
 		abstract = True
 
 
-class EventManager(models.Manager):
+class EventManager(EntityManager):
 	def get_query_set(self):
 		return EventQuerySet(self.model)
 
-class EventQuerySet(QuerySet):
+class EventQuerySet(EntityQuerySet):
 	def upcoming(self):
 		return self.filter(start_date__gte=datetime.date.today())
 	def current(self):
@@ -446,8 +445,26 @@ class CalendarView(FeedView):
 	def item_pubdate(self, item):
 		return item.created
 	
+	def get_latest_post_date(self, items):
+		"""Returns the latest ``created`` time of ``items``, using an aggregate query if they are an unsliced :class:`QuerySet` of events."""
+		if isinstance(items, models.query.QuerySet) and items.query.can_filter():
+			return items.aggregate(latest=models.Max('created'))['latest']
+		return super(CalendarView, self).get_latest_post_date(items)
+	
 	def item_categories(self, item):
-		return [tag.name for tag in item.tags.all()]
+		try:
+			tags = item._tag_list
+		except AttributeError:
+			tags = item.tags.all()
+		return [tag.name for tag in tags]
+	
+	def prefetch_feed_items(self, items):
+		fill_fk_caches(items, 'owner')
+		fill_fk_caches(items, 'site')
+		fill_gfk_caches(items, 'location')
+		tags = get_m2m_bulk(items, 'tags')
+		for item in items:
+			item._tag_list = tags.get(item.pk, [])
 	
 	def item_extra_kwargs(self, item):
 		return {
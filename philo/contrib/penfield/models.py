@@ -3,6 +3,7 @@ from datetime import date, datetime
 
 from django.conf import settings
 from django.conf.urls.defaults import url, patterns, include
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.http import Http404, HttpResponse
 from taggit.managers import TaggableManager
@@ -11,8 +12,9 @@ from taggit.models import Tag, TaggedItem
 from philo.contrib.winer.models import FeedView
 from philo.exceptions import ViewCanNotProvideSubpath
 from philo.models import Entity, Page, register_value_model
+from philo.models.nodes import content_cache
 from philo.models.fields import TemplateField
-from philo.utils import paginate
+from philo.utils import fill_fk_caches, get_m2m_bulk, paginate
 
 
 class Blog(Entity):
@@ -45,6 +47,20 @@ class Blog(Entity):
 register_value_model(Blog)
 
 
+def get_tag_names_bulk(items):
+	"""Returns a dictionary mapping the pk of each of ``items`` - instances of a single model with a ``django-taggit`` :class:`TaggableManager` - to a list of the names of its tags. The tags are fetched with a single query."""
+	if not items:
+		return {}
+	kwargs = {
+		'content_type': ContentType.objects.get_for_model(items[0]),
+		'object_id__in': [item.pk for item in items]
+	}
+	tag_names = {}
+	for tagged_item in TaggedItem.objects.filter(**kwargs).select_related('tag'):
+		tag_names.setdefault(tagged_item.object_id, []).append(tagged_item.tag.name)
+	return tag_names
+
+
 class BlogEntry(Entity):
 	"""Represents an entry in a :class:`Blog`."""
 	#: The title of the :class:`BlogEntry`.
@@ -88,6 +104,16 @@ class BlogEntry(Entity):
 register_value_model(BlogEntry)
 
 
+def invalidate_tags(sender, **kwargs):
+	"""Tags aren't philo content, but they are shown on the pages and in the feeds of :class:`BlogView`\ s and :class:`NewsletterView`\ s, so any change to a tag or to the tags of an item starts a new content generation (see :data:`.content_cache`)."""
+	content_cache.invalidate()
+
+
+for model in (Tag, TaggedItem):
+	models.signals.post_save.connect(invalidate_tags, sender=model)
+	models.signals.post_delete.connect(invalidate_tags, sender=model)
+
+
 class BlogView(FeedView):
 	"""
 	A subclass of :class:`.FeedView` which handles patterns and feeds for a :class:`Blog` and its related :class:`entries <BlogEntry>`.
@@ -347,8 +373,26 @@ class BlogView(FeedView):
 	def item_pubdate(self, item):
 		return item.date
 	
+	def get_latest_post_date(self, items):
+		"""Finds the latest entry date with a single aggregate query if ``items`` is an unsliced :class:`QuerySet`."""
+		if isinstance(items, models.query.QuerySet) and items.query.can_filter():
+			return items.aggregate(latest=models.Max('date'))['latest']
+		return super(BlogView, self).get_latest_post_date(items)
+	
 	def item_categories(self, item):
-		return [tag.name for tag in item.tags.all()]
+		try:
+			return item._tag_names
+		except AttributeError:
+			return [tag.name for tag in item.tags.all()]
+	
+	def get_feed_item_cache_dependencies(self, item):
+		return [self.item_author_name(item), self.item_categories(item)]
+	
+	def prefetch_feed_items(self, items):
+		fill_fk_caches(items, 'author')
+		tag_names = get_tag_names_bulk(items)
+		for item in items:
+			item._tag_names = tag_names.get(item.pk, [])
 
 
 class Newsletter(Entity):
@@ -599,7 +643,10 @@ class NewsletterView(FeedView):
 		return item.full_text
 	
 	def item_author_name(self, item):
-		authors = list(item.authors.all())
+		try:
+			authors = item._author_list
+		except AttributeError:
+			authors = list(item.authors.all())
 		if len(authors) > 1:
 			return "%s and %s" % (", ".join([author.get_full_name() for author in authors[:-1]]), authors[-1].get_full_name())
 		elif authors:
@@ -610,5 +657,24 @@ class NewsletterView(FeedView):
 	def item_pubdate(self, item):
 		return item.date
 	
+	def get_latest_post_date(self, items):
+		"""Like :meth:`BlogView.get_latest_post_date`, but for articles."""
+		if isinstance(items, models.query.QuerySet) and items.query.can_filter():
+			return items.aggregate(latest=models.Max('date'))['latest']
+		return super(NewsletterView, self).get_latest_post_date(items)
+	
 	def item_categories(self, item):
-		return [tag.name for tag in item.tags.all()]
\ No newline at end of file
+		try:
+			return item._tag_names
+		except AttributeError:
+			return [tag.name for tag in item.tags.all()]
+	
+	def get_feed_item_cache_dependencies(self, item):
+		return [self.item_author_name(item), self.item_categories(item)]
+	
+	def prefetch_feed_items(self, items):
+		authors = get_m2m_bulk(items, 'authors')
+		tag_names = get_tag_names_bulk(items)
+		for item in items:
+			item._author_list = authors.get(item.pk, [])
+			item._tag_names = tag_names.get(item.pk, [])
\ No newline at end of file
@@ -69,13 +69,14 @@ class NavigationManager(models.Manager):
 			tree_ids = []
 			
 			site_root_node = Site.objects.get_current().root_node
+			target_nodes = []
 			
 			for root in roots:
 				by_pk[root.pk] = root
 				tree_ids.append(getattr(root, item_opts.tree_id_attr))
 				root._cached_children = []
 				if root.target_node:
-					root.target_node.get_path(root=site_root_node)
+					target_nodes.append(root.target_node)
 				root.navigation = nav
 			
 			kwargs = {
@@ -91,7 +92,10 @@ class NavigationManager(models.Manager):
 				item.parent = by_pk[parent_pk]
 				item.parent._cached_children.append(item)
 				if item.target_node:
-					item.target_node.get_path(root=site_root_node)
+					target_nodes.append(item.target_node)
+			
+			# Memoize the paths of all the target nodes at once.
+			Node.objects.annotate_paths(target_nodes, root=site_root_node)
 			
 			cached = roots
 			cache.set(cache_key, cached)
@@ -1,23 +1,100 @@
+from datetime import datetime
+from itertools import chain, islice
+from types import MethodType
+
 from django.conf import settings
 from django.conf.urls.defaults import url, patterns, include
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site, RequestSite
 from django.contrib.syndication.views import add_domain
-from django.db import models
+from django.core.cache import cache
+from django.core.urlresolvers import get_urlconf, set_urlconf
+from django.db import connection, models
+from django.db.models.query import QuerySet
 from django.http import HttpResponse
-from django.template import RequestContext, Template as DjangoTemplate
-from django.utils import feedgenerator, tzinfo
-from django.utils.encoding import smart_unicode, force_unicode
+from django.template import RequestContext
+from django.utils import feedgenerator, translation, tzinfo
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import smart_str, smart_unicode, force_unicode
+from django.utils.hashcompat import md5_constructor
 from django.utils.html import escape
+from django.utils.xmlutils import SimplerXMLGenerator
 
 from philo.contrib.winer.exceptions import HttpNotAcceptable
 from philo.contrib.winer.feeds import registry, DEFAULT_FEED
 from philo.contrib.winer.middleware import http_not_acceptable
 from philo.models import Page, Template, MultiView
+from philo.models.nodes import content_cache, url_context
+from philo.models.pages import compiled_templates
+from philo.utils.http import negotiate_mime_type
+
+
+#: The mime type of the pages served by :class:`FeedView`\ s, which is offered alongside the registered feed types when :attr:`FeedView.negotiate_page_feeds` is ``True``.
+PAGE_MIME_TYPE = 'text/html'
+
+
+_feed_mime_types = [None, (), {}]
+
+
+def get_feed_mime_types():
+	"""Returns a tuple of the mime types of the registered feed classes and a dictionary mapping each of those mime types to its class. These are only rebuilt when the registry changes."""
+	if _feed_mime_types[0] != registry.version:
+		by_mime_type = dict([(obj.mime_type, obj) for obj in registry.values()])
+		_feed_mime_types[:] = [registry.version, tuple(by_mime_type), by_mime_type]
+	return _feed_mime_types[1], _feed_mime_types[2]
 
-try:
-	import mimeparse
-except:
-	mimeparse = None
+
+#: Maps (class, attribute name) pairs to the accessors used by :class:`FeedView`\ s to look up dynamic attributes, so that each class's attributes are only inspected once.
+_dynamic_attr_accessors = {}
+
+
+def _get_dynamic_attr_accessor(cls, attname):
+	# Returns a function taking (view, obj, default) which looks up the dynamic
+	# attribute ``attname`` for instances of ``cls``.
+	attr = getattr(cls, attname, None)
+	if isinstance(attr, MethodType) and attr.im_self is None:
+		# An ordinary method - check its argument count now instead of on every call.
+		func = attr.im_func
+		if func.func_code.co_argcount == 2: # one argument is 'self'
+			return lambda view, obj, default: func(view, obj)
+		return lambda view, obj, default: func(view)
+	return None
+
+
+class _FeedBuffer(object):
+	# A minimal file-like object which collects what is written to it until it is flushed.
+	def __init__(self):
+		self.chunks = []
+	
+	def write(self, data):
+		self.chunks.append(data)
+	
+	def flush(self):
+		data = ''.join(self.chunks)
+		self.chunks = []
+		return data
+
+
+class _FeedItemsMarker(object):
+	# Stands in for a feed's items while the rest of the feed is written. When
+	# the feed writes its items, a marker is written instead.
+	marker = '\x00philo-feed-items\x00'
+	
+	def __init__(self, out):
+		self.out = out
+	
+	def __iter__(self):
+		self.out.write(self.marker)
+		return iter(())
+
+
+def render_item_template(template, context, item):
+	"""Renders the compiled ``template`` with ``item`` pushed onto ``context`` as ``obj``, then pops it off again so that ``context`` can be reused for the next item."""
+	context.update({'obj': item})
+	try:
+		return template.render(context)
+	finally:
+		context.pop()
 
 
 class FeedView(MultiView):
@@ -57,6 +134,23 @@ class FeedView(MultiView):
 	#: An attribute holding a description of the feeds served by the :class:`FeedView`. This is a required part of the :class:`django.contrib.syndication.view.Feed` API.
 	description = ""
 	
+	#: Whether feeds with a blank :attr:`feed_length` should be streamed to the response item by item instead of being built in memory. Default: ``True``.
+	#:
+	#: .. seealso:: :meth:`should_stream_feed`, :meth:`stream_feed`
+	stream_unlimited_feeds = True
+	#: The number of items which :meth:`iter_feed_items` fetches, prefetches related data for, and renders at once. Default: 100.
+	feed_chunk_size = 100
+	
+	#: Whether the page URLs provided by :meth:`feed_patterns` should also serve a feed to clients whose Accept header prefers one of the registered feed types to HTML. Default: ``False``.
+	#:
+	#: .. seealso:: :meth:`negotiated_page_view`
+	negotiate_page_feeds = False
+	
+	#: The number of seconds for which rendered feed documents and feed items will be cached, or ``None`` if they should not be cached. Default: the value of :setting:`PHILO_FEED_CACHE_TIMEOUT`, or ``None``.
+	#:
+	#: .. seealso:: :meth:`get_feed_cache_timeout`
+	feed_cache_timeout = getattr(settings, 'PHILO_FEED_CACHE_TIMEOUT', None)
+	
 	def feed_patterns(self, base, get_items_attr, page_attr, reverse_name):
 		"""
 		Given the name to be used to reverse this view and the names of the attributes for the function that fetches the objects, returns patterns suitable for inclusion in urlpatterns. In addition to ``base`` (which will serve the page at ``page_attr``) and ``base`` + :attr:`feed_suffix` (which will serve a :attr:`feed_type` feed), patterns will be provided for each registered feed type as ``base`` + ``slug``.
@@ -94,7 +188,10 @@ class FeedView(MultiView):
 				feed_view = http_not_acceptable(self.feed_view(get_items_attr, reverse_name, feed_type))
 				feed_pattern = r'%s%s%s$' % (base, "/" if base and base[-1] != "^" else "", suffix)
 				feed_patterns += (url(feed_pattern, feed_view, name="%s_%s" % (reverse_name, suffix)),)
-		feed_patterns += (url(r"%s$" % base, self.page_view(get_items_attr, page_attr), name=reverse_name),)
+		page_view = self.page_view(get_items_attr, page_attr)
+		if self.feeds_enabled and self.negotiate_page_feeds:
+			page_view = self.negotiated_page_view(page_view, get_items_attr, reverse_name)
+		feed_patterns += (url(r"%s$" % base, page_view, name=reverse_name),)
 		return patterns('', *feed_patterns)
 	
 	def get_object(self, request, **kwargs):
@@ -115,17 +212,77 @@ class FeedView(MultiView):
 		get_items = get_items_attr if callable(get_items_attr) else getattr(self, get_items_attr)
 		
 		def inner(request, extra_context=None, *args, **kwargs):
+			timeout = self.get_feed_cache_timeout(request)
+			if timeout is not None:
+				cache_key = self.get_feed_cache_key(request, self.get_feed_type(request, feed_type), args, kwargs)
+				cached = cache.get(cache_key)
+				if cached is not None:
+					mime_type, content = cached
+					response = HttpResponse(content, mimetype=mime_type)
+					if feed_type is None:
+						patch_vary_headers(response, ('Accept',))
+					return response
+			
 			obj = self.get_object(request, *args, **kwargs)
 			feed = self.get_feed(obj, request, reverse_name, feed_type, *args, **kwargs)
 			items, xxx = get_items(obj, request, extra_context=extra_context, *args, **kwargs)
-			self.populate_feed(feed, items, request)
 			
-			response = HttpResponse(mimetype=feed.mime_type)
-			feed.write(response, 'utf-8')
+			if self.should_stream_feed(feed):
+				response = HttpResponse(self.stream_feed(feed, items, request, 'utf-8'), mimetype=feed.mime_type)
+			else:
+				self.populate_feed(feed, items, request)
+				response = HttpResponse(mimetype=feed.mime_type)
+				feed.write(response, 'utf-8')
+				
+				if timeout is not None:
+					cache.set(cache_key, (feed.mime_type, response.content), timeout)
+			
+			# The feed type was chosen based on the Accept header.
+			if feed_type is None:
+				patch_vary_headers(response, ('Accept',))
 			return response
 		
 		return inner
 	
+	def get_feed_cache_timeout(self, request):
+		"""Returns the number of seconds for which the feed document and items for ``request`` may be cached, or ``None`` if they may not be cached. By default, returns :attr:`feed_cache_timeout` for GET and HEAD requests by anonymous users and ``None`` otherwise."""
+		if self.feed_cache_timeout is None or request.method not in ('GET', 'HEAD'):
+			return None
+		
+		if hasattr(request, 'user') and request.user.is_authenticated():
+			return None
+		
+		return self.feed_cache_timeout
+	
+	def get_feed_cache_key(self, request, feed_type, args, kwargs):
+		"""Returns the cache key for the ``feed_type`` feed document rendered for ``request`` with the view arguments ``args`` and ``kwargs``. The key includes the current content generation (see :data:`.content_cache`), so cached documents are discarded whenever philo content - such as an item of the feed - changes."""
+		key = (content_cache.get_version(), ContentType.objects.get_for_model(self).pk, self.pk, request.node.pk, registry.get_slug(feed_type), args, sorted(kwargs.items()), request.get_host(), request.is_secure())
+		return "philo.feed.%s" % md5_constructor(smart_str(repr(key))).hexdigest()
+	
+	def get_feed_item_cache_key(self, request, item):
+		"""
+		Returns the cache key for the data which :meth:`populate_feed` renders for ``item``, or ``None`` if the data should not be cached. Unlike :meth:`get_feed_cache_key`, the key doesn't include the content generation, so that other content changing doesn't discard every item. Instead, it is made up of what the item's data depends on: the item and the values of its fields, the :class:`FeedView` and the values of its fields, the generation of the item templates (see :data:`.compiled_templates`), the path of the node which the item's link goes through, and anything returned by :meth:`get_feed_item_cache_dependencies`. By default, only model instances are cached.
+		
+		"""
+		if not isinstance(item, models.Model) or item.pk is None:
+			return None
+		
+		if self.item_title_template_id is not None or self.item_description_template_id is not None:
+			template_version = compiled_templates.get_version()
+		else:
+			template_version = None
+		
+		key = (
+			ContentType.objects.get_for_model(self).pk, self.pk, [getattr(self, field.attname) for field in self._meta.fields], template_version,
+			ContentType.objects.get_for_model(item).pk, item.pk, [getattr(item, field.attname) for field in item._meta.fields], self.get_feed_item_cache_dependencies(item),
+			request.node.pk, url_context.get_path(request.node), request.get_host(), request.is_secure()
+		)
+		return "philo.feed_item.%s" % md5_constructor(smart_str(repr(key))).hexdigest()
+	
+	def get_feed_item_cache_dependencies(self, item):
+		"""Returns a list of any values besides the fields of ``item`` which its rendered data depends on - for example, the names of its tags - to be included in its :meth:`cache key <get_feed_item_cache_key>`. This is called after :meth:`prefetch_feed_items`. By default, returns an empty list."""
+		return []
+	
 	def page_view(self, get_items_attr, page_attr):
 		"""
 		:param get_items_attr: A callable or the name of a callable on the :class:`FeedView` that will return a (items, extra_context) tuple when called with view arguments.
@@ -149,6 +306,27 @@ class FeedView(MultiView):
 			return page.render_to_response(request, extra_context=context)
 		return inner
 	
+	def negotiated_page_view(self, page_view, get_items_attr, reverse_name):
+		"""
+		Returns a view function which serves ``page_view`` to clients that prefer HTML and a feed, as returned by :meth:`feed_view`, to clients that prefer one of the registered feed types. The choice is made by :func:`.negotiate_mime_type`. Clients which accept none of the offered types are served the page.
+		
+		:param page_view: The view function returned by :meth:`page_view`.
+		:param get_items_attr: Passed directly to :meth:`feed_view`.
+		:param reverse_name: Passed directly to :meth:`feed_view`.
+		
+		"""
+		def inner(request, *args, **kwargs):
+			mime_types, by_mime_type = get_feed_mime_types()
+			mime_type = negotiate_mime_type(request.META.get('HTTP_ACCEPT'), (PAGE_MIME_TYPE,) + mime_types)
+			if mime_type is None or mime_type == PAGE_MIME_TYPE:
+				response = page_view(request, *args, **kwargs)
+			else:
+				feed_type = registry.get_slug(by_mime_type[mime_type])
+				response = http_not_acceptable(self.feed_view(get_items_attr, reverse_name, feed_type))(request, *args, **kwargs)
+			patch_vary_headers(response, ('Accept',))
+			return response
+		return inner
+	
 	def process_page_items(self, request, items):
 		"""
 		Hook for handling any extra processing of ``items`` based on an :class:`HttpRequest`, such as pagination or searching. This method is expected to return a list of items and a dictionary to be added to the page context.
@@ -165,34 +343,20 @@ class FeedView(MultiView):
 		
 		Otherwise, intelligently chooses a feed type for a given request. Tries to return :attr:`feed_type`, but if the Accept header does not include that mimetype, tries to return the best match from the feed types that are offered by the :class:`FeedView`. If none of the offered feed types are accepted by the :class:`HttpRequest`, raises :exc:`.HttpNotAcceptable`.
 		
-		If `mimeparse <http://code.google.com/p/mimeparse/>`_ is installed, it will be used to select the best matching accepted format; otherwise, the first available format that is accepted will be selected.
+		The negotiation is done by :func:`.negotiate_mime_type`, which caches its results by Accept header. If `mimeparse <http://code.google.com/p/mimeparse/>`_ is installed, it will be used to select the best matching accepted format; otherwise, the first available format that is accepted will be selected.
 		
 		"""
 		if feed_type is not None:
 			feed_type = registry[feed_type]
-			loose = False
+			mime_types = by_mime_type = ()
 		else:
 			feed_type = registry.get(self.feed_type, DEFAULT_FEED)
-			loose = True
-		mt = feed_type.mime_type
-		accept = request.META.get('HTTP_ACCEPT')
-		if accept and mt not in accept and "*/*" not in accept and "%s/*" % mt.split("/")[0] not in accept:
-			# Wups! They aren't accepting the chosen format.
-			feed_type = None
-			if loose:
-				# Is there another format we can use?
-				accepted_mts = dict([(obj.mime_type, obj) for obj in registry.values()])
-				if mimeparse:
-					mt = mimeparse.best_match(accepted_mts.keys(), accept)
-					if mt:
-						feed_type = accepted_mts[mt]
-				else:
-					for mt in accepted_mts:
-						if mt in accept or "%s/*" % mt.split("/")[0] in accept:
-							feed_type = accepted_mts[mt]
-							break
-			if not feed_type:
-				raise HttpNotAcceptable
+			mime_types, by_mime_type = get_feed_mime_types()
+		mime_type = negotiate_mime_type(request.META.get('HTTP_ACCEPT'), mime_types, feed_type.mime_type)
+		if mime_type is None:
+			raise HttpNotAcceptable
+		if mime_type != feed_type.mime_type:
+			feed_type = by_mime_type[mime_type]
 		return feed_type
 	
 	def get_feed(self, obj, request, reverse_name, feed_type=None, *args, **kwargs):
@@ -208,7 +372,7 @@ class FeedView(MultiView):
 		
 		"""
 		try:
-			current_site = Site.objects.get_current()
+			current_site = url_context.get_current_site()
 		except Site.DoesNotExist:
 			current_site = RequestSite(request)
 		
@@ -239,77 +403,222 @@ class FeedView(MultiView):
 		return feed
 	
 	def populate_feed(self, feed, items, request):
-		"""Populates a :class:`django.utils.feedgenerator.DefaultFeed` instance as is returned by :meth:`get_feed` with the passed-in ``items``."""
+		"""Populates a :class:`django.utils.feedgenerator.DefaultFeed` instance as is returned by :meth:`get_feed` with the passed-in ``items``. See :meth:`iter_feed_items`."""
+		if self.feed_length is not None:
+			items = items[:self.feed_length]
+		
+		for item_kwargs in self.iter_feed_items(items, request):
+			feed.add_item(**item_kwargs)
+	
+	def iter_feed_items(self, items, request):
+		"""
+		Yields a dictionary of keyword arguments for :meth:`add_item <django.utils.feedgenerator.SyndicationFeed.add_item>` for each of ``items``. Items are handled in chunks of :attr:`feed_chunk_size`: :meth:`prefetch_feed_items` is called for each chunk, and then, if :meth:`get_feed_cache_timeout` returns a timeout, the data for each item will be cached separately (see :meth:`get_feed_item_cache_key`) so that only items without cached data will be rendered.
+		
+		"""
 		if self.item_title_template:
-			title_template = DjangoTemplate(self.item_title_template.code)
+			title_template = self.item_title_template.get_compiled()
 		else:
 			title_template = None
 		if self.item_description_template:
-			description_template = DjangoTemplate(self.item_description_template.code)
+			description_template = self.item_description_template.get_compiled()
 		else:
 			description_template = None
 		
 		node = request.node
 		try:
-			current_site = Site.objects.get_current()
+			current_site = url_context.get_current_site()
 		except Site.DoesNotExist:
 			current_site = RequestSite(request)
 		
-		if self.feed_length is not None:
-			items = items[:self.feed_length]
+		timeout = self.get_feed_cache_timeout(request)
 		
-		for item in items:
-			if title_template is not None:
-				title = title_template.render(RequestContext(request, {'obj': item}))
-			else:
-				title = self.__get_dynamic_attr('item_title', item)
-			if description_template is not None:
-				description = description_template.render(RequestContext(request, {'obj': item}))
-			else:
-				description = self.__get_dynamic_attr('item_description', item)
+		# A single context is shared by all the items, so that context processors
+		# only run once. Each item is pushed onto it while its templates render.
+		context = None
+		
+		items = iter(items)
+		while True:
+			chunk = list(islice(items, self.feed_chunk_size))
+			if not chunk:
+				break
 			
-			link = node.construct_url(self.reverse(obj=item), with_domain=True, request=request, secure=request.is_secure())
+			# The cache keys can depend on the prefetched data, so every item of the
+			# chunk is prefetched.
+			self.prefetch_feed_items(chunk)
 			
-			enc = None
-			enc_url = self.__get_dynamic_attr('item_enclosure_url', item)
-			if enc_url:
-				enc = feedgenerator.Enclosure(
-					url = smart_unicode(add_domain(
-							current_site.domain,
-							enc_url,
-							request.is_secure()
-					)),
-					length = smart_unicode(self.__get_dynamic_attr('item_enclosure_length', item)),
-					mime_type = smart_unicode(self.__get_dynamic_attr('item_enclosure_mime_type', item))
-				)
-			author_name = self.__get_dynamic_attr('item_author_name', item)
-			if author_name is not None:
-				author_email = self.__get_dynamic_attr('item_author_email', item)
-				author_link = self.__get_dynamic_attr('item_author_link', item)
+			if timeout is not None:
+				keys = [self.get_feed_item_cache_key(request, item) for item in chunk]
+				cached = cache.get_many([key for key in keys if key is not None])
 			else:
-				author_email = author_link = None
+				keys = None
+				cached = {}
+			new = {}
 			
-			pubdate = self.__get_dynamic_attr('item_pubdate', item)
-			if pubdate and not pubdate.tzinfo:
-				ltz = tzinfo.LocalTimezone(pubdate)
-				pubdate = pubdate.replace(tzinfo=ltz)
+			for i, item in enumerate(chunk):
+				key = keys and keys[i]
+				item_kwargs = cached.get(key) if key is not None else None
+				if item_kwargs is None:
+					if context is None and (title_template is not None or description_template is not None):
+						context = RequestContext(request)
+					item_kwargs = self._get_item_kwargs(item, request, node, current_site, title_template, description_template, context)
+					if key is not None:
+						new[key] = item_kwargs
+				
+				# Timezones are added after caching so that only naive datetimes are pickled.
+				item_kwargs = item_kwargs.copy()
+				pubdate = item_kwargs['pubdate']
+				if pubdate and not pubdate.tzinfo:
+					ltz = tzinfo.LocalTimezone(pubdate)
+					item_kwargs['pubdate'] = pubdate.replace(tzinfo=ltz)
+				
+				yield item_kwargs
 			
-			feed.add_item(
-				title = title,
-				link = link,
-				description = description,
-				unique_id = self.__get_dynamic_attr('item_guid', item, link),
-				enclosure = enc,
-				pubdate = pubdate,
-				author_name = author_name,
-				author_email = author_email,
-				author_link = author_link,
-				categories = self.__get_dynamic_attr('item_categories', item),
-				item_copyright = self.__get_dynamic_attr('item_copyright', item),
-				**self.item_extra_kwargs(item)
+			if new:
+				cache.set_many(new, timeout)
+	
+	def should_stream_feed(self, feed):
+		"""Returns ``True`` if ``feed`` should be written with :meth:`stream_feed`. By default, this is the case if :attr:`stream_unlimited_feeds` is ``True``, :attr:`feed_length` is blank, and the feed's class writes its items with a ``write_items`` method, as RSS and Atom feeds do."""
+		return self.stream_unlimited_feeds and self.feed_length is None and hasattr(feed, 'write_items')
+	
+	def stream_feed(self, feed, items, request, encoding='utf-8'):
+		"""
+		Returns an iterator over the encoded document for the :meth:`get_feed` instance ``feed`` populated with ``items``. Items are rendered and written to the document one at a time, and if ``items`` is a :class:`QuerySet` it will be read with :meth:`~django.db.models.query.QuerySet.iterator`, so that model instances are only created as they are needed. (Some database drivers, such as psycopg2, still fetch every row of the query at once.)
+		
+		The feed's latest post date is written before any of the items, so it is found with :meth:`get_latest_post_date`. Streamed documents are never held in memory as a whole, so they aren't stored in the feed document cache (see :meth:`get_feed_cache_key`); their items are still cached separately by :meth:`iter_feed_items`.
+		
+		Streaming has some limits:
+		
+		- WSGI servers iterate over the document after django has finished the request: :data:`~django.core.signals.request_finished` has been sent, the response middleware has run, and the urlconf, the active language, and the :data:`.url_context` have been reset. The latest post date, the head of the document, and the first chunk of items (along with the context that item templates are rendered with) are therefore handled before this method returns. If the rest of the document is read after :class:`.RequestNodeMiddleware` has deactivated the :data:`.url_context`, the request's urlconf, language, and :data:`.url_context` are restored while the items are rendered, and the database connection - which was already closed for the request - is closed again once the document has been read. Without :class:`.RequestNodeMiddleware`, none of this is done.
+		- Middleware which reads the whole response content, such as :class:`~django.middleware.gzip.GZipMiddleware` or :class:`~django.middleware.http.ConditionalGetMiddleware`, holds the whole document in memory anyway.
+		
+		"""
+		latest_post_date = self.get_latest_post_date(items) or datetime.now()
+		if not latest_post_date.tzinfo:
+			latest_post_date = latest_post_date.replace(tzinfo=tzinfo.LocalTimezone(latest_post_date))
+		feed.latest_post_date = lambda: latest_post_date
+		
+		if isinstance(items, QuerySet):
+			items = items.iterator()
+		item_kwargs_iter = self.iter_feed_items(items, request)
+		
+		try:
+			first = item_kwargs_iter.next()
+		except StopIteration:
+			first = None
+		else:
+			item_kwargs_iter = chain([first], item_kwargs_iter)
+		
+		# Write the document without any items, marking the place where the items
+		# belong so that the document can be split around them.
+		out = _FeedBuffer()
+		feed.items = _FeedItemsMarker(out)
+		feed.write(out, encoding)
+		head, tail = out.flush().split(_FeedItemsMarker.marker, 1)
+		feed.items = []
+		
+		if first is None:
+			return iter([head, tail])
+		return self._iter_streamed_feed(feed, head, tail, item_kwargs_iter, out, encoding, url_context.active, get_urlconf(), translation.get_language())
+	
+	def _iter_streamed_feed(self, feed, head, tail, item_kwargs_iter, out, encoding, active, urlconf, language):
+		yield head
+		
+		# If the request was active when the document was started but isn't any
+		# more, the rest of the document is being read after the request finished.
+		finished = active and not url_context.active
+		if finished:
+			url_context.activate()
+			set_urlconf(urlconf)
+			translation.activate(language)
+		
+		try:
+			handler = SimplerXMLGenerator(out, encoding)
+			for item_kwargs in item_kwargs_iter:
+				feed.items = []
+				feed.add_item(**item_kwargs)
+				feed.write_items(handler)
+				yield out.flush()
+			feed.items = []
+			
+			yield tail
+		finally:
+			if finished:
+				url_context.deactivate()
+				set_urlconf(None)
+				translation.deactivate()
+				connection.close()
+	
+	def get_latest_post_date(self, items):
+		"""Returns the latest publication date of any of ``items``, or ``None`` if none of them has one. This is used by :meth:`stream_feed`. By default, each item's :meth:`item_pubdate` is looked up, which means reading ``items`` an extra time; :class:`FeedView`\ s whose items are a :class:`QuerySet` can override this with an aggregate query."""
+		if isinstance(items, QuerySet):
+			items = items.iterator()
+		latest = None
+		for item in items:
+			pubdate = self.__get_dynamic_attr('item_pubdate', item)
+			if pubdate is not None and (latest is None or pubdate > latest):
+				latest = pubdate
+		return latest
+	
+	def _get_item_kwargs(self, item, request, node, current_site, title_template, description_template, context=None):
+		# Returns the keyword arguments for feed.add_item for the item.
+		if context is None and (title_template is not None or description_template is not None):
+			context = RequestContext(request)
+		if title_template is not None:
+			title = render_item_template(title_template, context, item)
+		else:
+			title = self.__get_dynamic_attr('item_title', item)
+		if description_template is not None:
+			description = render_item_template(description_template, context, item)
+		else:
+			description = self.__get_dynamic_attr('item_description', item)
+		
+		link = node.construct_url(self.reverse(obj=item), with_domain=True, request=request, secure=request.is_secure())
+		
+		enc = None
+		enc_url = self.__get_dynamic_attr('item_enclosure_url', item)
+		if enc_url:
+			enc = feedgenerator.Enclosure(
+				url = smart_unicode(add_domain(
+						current_site.domain,
+						enc_url,
+						request.is_secure()
+				)),
+				length = smart_unicode(self.__get_dynamic_attr('item_enclosure_length', item)),
+				mime_type = smart_unicode(self.__get_dynamic_attr('item_enclosure_mime_type', item))
 			)
+		author_name = self.__get_dynamic_attr('item_author_name', item)
+		if author_name is not None:
+			author_email = self.__get_dynamic_attr('item_author_email', item)
+			author_link = self.__get_dynamic_attr('item_author_link', item)
+		else:
+			author_email = author_link = None
+		
+		item_kwargs = dict(
+			title = title,
+			link = link,
+			description = description,
+			unique_id = self.__get_dynamic_attr('item_guid', item, link),
+			enclosure = enc,
+			pubdate = self.__get_dynamic_attr('item_pubdate', item),
+			author_name = author_name,
+			author_email = author_email,
+			author_link = author_link,
+			categories = self.__get_dynamic_attr('item_categories', item),
+			item_copyright = self.__get_dynamic_attr('item_copyright', item),
+		)
+		item_kwargs.update(self.item_extra_kwargs(item))
+		return item_kwargs
 	
 	def __get_dynamic_attr(self, attname, obj, default=None):
+		key = (self.__class__, attname)
+		try:
+			accessor = _dynamic_attr_accessors[key]
+		except KeyError:
+			accessor = _dynamic_attr_accessors[key] = _get_dynamic_attr_accessor(self.__class__, attname)
+		
+		if accessor is not None and attname not in self.__dict__:
+			return accessor(self, obj, default)
+		
 		try:
 			attr = getattr(self, attname)
 		except AttributeError:
@@ -329,6 +638,10 @@ class FeedView(MultiView):
 				return attr()
 		return attr
 	
+	def prefetch_feed_items(self, items):
+		"""Hook for loading related data for all of ``items`` - a list of the items which :meth:`populate_feed` is about to handle - in bulk, for example by filling the caches of foreign keys. By default, does nothing."""
+		pass
+	
 	def feed_extra_kwargs(self, obj):
 		"""Returns an extra keyword arguments dictionary that is used when initializing the feed generator."""
 		return {}
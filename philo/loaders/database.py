@@ -3,6 +3,7 @@ from django.template.loader import BaseLoader
 from django.utils.encoding import smart_unicode
 
 from philo.models import Template
+from philo.models.pages import template_paths
 
 
 class Loader(BaseLoader):
@@ -12,9 +13,35 @@ class Loader(BaseLoader):
 	"""
 	is_usable=True
 	
-	def load_template_source(self, template_name, template_dirs=None):
+	def get_template(self, template_name):
 		try:
-			template = Template.objects.get_with_path(template_name)
+			return Template.objects.get_with_path(template_name)
 		except Template.DoesNotExist:
 			raise TemplateDoesNotExist(template_name)
-		return (template.code, smart_unicode(template))
\ No newline at end of file
+	
+	def load_template_source(self, template_name, template_dirs=None):
+		template = self.get_template(template_name)
+		return (template.code, smart_unicode(template))
+	
+	def load_template(self, template_name, template_dirs=None):
+		# Share compiled templates with the rest of philo instead of
+		# compiling the template code on every load.
+		return self.get_template(template_name).get_compiled(), None
+
+
+class CachedLoader(Loader):
+	"""
+	:class:`philo.loaders.database.CachedLoader` caches the :class:`.Template` found for each template name, as well as names which do not match any :class:`.Template`, so that repeated loads do not query the database. Unlike django's cached loader, the cache is emptied whenever a :class:`.Template` is saved, deleted, or moved, so changes made in the admin take effect immediately. This makes it reasonable to put the database loader first in ``TEMPLATE_LOADERS``.
+	
+	"""
+	def get_template(self, template_name):
+		template = template_paths.get(template_name, False)
+		if template is False:
+			try:
+				template = super(CachedLoader, self).get_template(template_name)
+			except TemplateDoesNotExist:
+				template = None
+			template_paths.set(template_name, template)
+		if template is None:
+			raise TemplateDoesNotExist(template_name)
+		return template
\ No newline at end of file
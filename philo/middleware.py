@@ -1,15 +1,130 @@
 from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.http import Http404
 
 from philo.models import Node, View
+from philo.models.nodes import content_cache, route_cache, url_context
 from philo.utils.lazycompat import SimpleLazyObject
 
 
+#: Whether :func:`get_node` should resolve paths against an in-process route table instead of querying the database. The table is rebuilt whenever a :class:`.Node` or :class:`Site` changes; processes which share a cache backend will rebuild their tables together. This can be enabled by setting :setting:`PHILO_CACHE_ROUTES` to ``True``.
+CACHE_ROUTES = getattr(settings, 'PHILO_CACHE_ROUTES', False)
+
+
+def build_route_table(root_id=None):
+	"""
+	Returns a dictionary mapping the slug paths of :class:`.Node`\ s beneath the :class:`.Node` with a pk of ``root_id`` (or beneath the roots of all trees if ``root_id`` is ``None``) to a (``node_pk``, ``view_content_type_id``, ``view_object_id``, ``accepts_subpath``, ``field_values``) tuple for the :class:`.Node` at that path. The root itself, if given, is stored at the path ``''``.
+	
+	"""
+	opts = Node._mptt_meta
+	parent_attname = "%s_id" % opts.parent_attr
+	pk_attname = Node._meta.pk.attname
+	fields = [f.attname for f in Node._meta.fields]
+	
+	if root_id is None:
+		nodes = Node.objects.all()
+	else:
+		try:
+			root = Node.objects.get(pk=root_id)
+		except Node.DoesNotExist:
+			return {}
+		nodes = root.get_descendants(include_self=True)
+	
+	paths = {}
+	table = {}
+	
+	for values in nodes.order_by(opts.tree_id_attr, opts.left_attr).values(*fields):
+		pk = values[pk_attname]
+		parent_id = values[parent_attname]
+		
+		if pk == root_id:
+			path = ''
+		elif paths.get(parent_id):
+			path = '/'.join((paths[parent_id], values['slug']))
+		else:
+			path = values['slug']
+		paths[pk] = path
+		
+		view_content_type_id = values['view_content_type_id']
+		view_object_id = values['view_object_id']
+		accepts_subpath = False
+		if view_content_type_id and view_object_id:
+			view_model = ContentType.objects.get_for_id(view_content_type_id).model_class()
+			accepts_subpath = getattr(view_model, 'accepts_subpath', False)
+		
+		table[path] = (pk, view_content_type_id, view_object_id, accepts_subpath, dict((str(k), v) for k, v in values.items()))
+	
+	return table
+
+
+def get_route_table(root_id=None):
+	"""Returns the route table for ``root_id`` (as built by :func:`build_route_table`) from the :data:`.route_cache`, building it if necessary."""
+	table = route_cache.get(root_id)
+	if table is None:
+		table = build_route_table(root_id)
+		route_cache.set(root_id, table)
+	return table
+
+
+def get_route_paths(root_id=None):
+	"""Returns a dictionary mapping the pks of the :class:`.Node`\ s in the route table for ``root_id`` to their paths. The dictionary is kept in the :data:`.route_cache` alongside the table."""
+	key = ('paths', root_id)
+	paths = route_cache.get(key)
+	if paths is None:
+		paths = dict([(route[0], path) for path, route in get_route_table(root_id).iteritems()])
+		route_cache.set(key, paths)
+	return paths
+
+
+def get_route(path, root_id=None):
+	"""Returns the route table entry (as built by :func:`build_route_table`) for the deepest :class:`.Node` along ``path`` and the remainder of the path as a string (or ``None`` if there is no remaining path). If no :class:`.Node` is found, returns (``None``, ``None``)."""
+	table = get_route_table(root_id)
+	
+	segments = [segment for segment in path.split('/') if segment]
+	
+	for depth in xrange(len(segments), -1, -1):
+		try:
+			route = table['/'.join(segments[:depth])]
+		except KeyError:
+			continue
+		return route, '/'.join(segments[depth:]) or None
+	
+	return None, None
+
+
+def get_route_view(view_content_type_id, view_object_id):
+	"""
+	Returns a :class:`.View` instance for a route table entry's view, or ``None`` if the entry has no view or the view does not exist. The values of the view's fields are kept in the :data:`.content_cache`, which is invalidated whenever a :class:`.View` (or any other philo content) is saved or deleted, so that routing a request to a cached view does not query the database. A new instance is built for each call.
+	
+	"""
+	if not view_content_type_id or not view_object_id:
+		return None
+	
+	view_model = ContentType.objects.get_for_id(view_content_type_id).model_class()
+	if view_model is None:
+		return None
+	
+	key = ('route_view', view_content_type_id, view_object_id)
+	values = content_cache.get(key)
+	if values is None:
+		try:
+			values = view_model._default_manager.filter(pk=view_object_id).values(*[f.attname for f in view_model._meta.fields])[0]
+		except IndexError:
+			return None
+		values = dict((str(k), v) for k, v in values.items())
+		content_cache.set(key, values)
+	
+	view = view_model(**values)
+	view._state.adding = False
+	view._state.db = view_model._default_manager.db
+	return view
+
+
 def get_node(path):
-	"""Returns a :class:`Node` instance at ``path`` (relative to the current site) or ``None``."""
+	"""Returns a :class:`Node` instance at ``path`` (relative to the current site) or ``None``. If :data:`CACHE_ROUTES` is ``True``, the node's :attr:`~.Node.view` is returned along with it (see :func:`get_route_view`)."""
 	try:
-		current_site = Site.objects.get_current()
+		current_site = url_context.get_current_site()
 	except Site.DoesNotExist:
 		current_site = None
 	
@@ -17,10 +132,23 @@ def get_node(path):
 	if path[-1] == '/':
 		trailing_slash = True
 	
-	try:
-		node, subpath = Node.objects.get_with_path(path, root=getattr(current_site, 'root_node', None), absolute_result=False)
-	except Node.DoesNotExist:
-		return None
+	if CACHE_ROUTES:
+		route, subpath = get_route(path, getattr(current_site, 'root_node_id', None))
+		if route is None:
+			return None
+		node = Node(**route[4])
+		node._state.adding = False
+		node._state.db = Node.objects.db
+		
+		# Fetch the view along with the node, so that rendering doesn't need a second round-trip.
+		view = get_route_view(route[1], route[2])
+		if view is not None:
+			setattr(node, Node.view.cache_attr, view)
+	else:
+		try:
+			node, subpath = Node.objects.get_with_path(path, root=getattr(current_site, 'root_node', None), absolute_result=False)
+		except Node.DoesNotExist:
+			return None
 	
 	if subpath is None:
 		subpath = ""
@@ -41,7 +169,12 @@ class RequestNodeMiddleware(object):
 	
 	:class:`RequestNodeMiddleware` also catches all exceptions raised while handling requests that have attached :class:`.Node`\ s if :setting:`settings.DEBUG` is ``True``. If a :exc:`django.http.Http404` error was caught, :class:`RequestNodeMiddleware` will look for an "Http404" :class:`.Attribute` on the request's :class:`.Node`; otherwise it will look for an "Http500" :class:`.Attribute`. If an appropriate :class:`.Attribute` is found, and the value of the attribute is a :class:`.View` instance, then the :class:`.View` will be rendered with the exception in the ``extra_context``, bypassing any later handling of exceptions.
 	
+	While a request is handled, :class:`RequestNodeMiddleware` also activates the :data:`.url_context`, so that the current :class:`Site` and the paths of :class:`.Node`\ s are only looked up once per request when URLs are constructed.
+	
 	"""
+	def process_request(self, request):
+		url_context.activate()
+	
 	def process_view(self, request, view_func, view_args, view_kwargs):
 		try:
 			path = view_kwargs['path']
@@ -68,4 +201,8 @@ class RequestNodeMiddleware(object):
 		extra_context = {'exception': exception}
 		response = error_view.render_to_response(request, extra_context)
 		response.status_code = status_code
-		return response
\ No newline at end of file
+		return response
+	
+	def process_response(self, request, response):
+		url_context.deactivate()
+		return response
@@ -1,22 +1,40 @@
+import operator
+from hashlib import sha1
+from itertools import chain
+
 from django import forms
+from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
 from django.utils import simplejson as json
-from django.utils.encoding import force_unicode
+from django.utils.encoding import force_unicode, smart_str
 from mptt.models import MPTTModel, MPTTModelBase, MPTTOptions
 
 from philo.exceptions import AncestorDoesNotExist
 from philo.models.fields import JSONField
 from philo.signals import entity_class_prepared
-from philo.utils import ContentTypeRegistryLimiter, ContentTypeSubclassLimiter
-from philo.utils.entities import AttributeMapper, TreeAttributeMapper
+from philo.utils import ContentTypeRegistryLimiter, ContentTypeSubclassLimiter, commit_on_success_unless_managed
+from philo.utils.cache import VersionedCache
+from philo.utils.entities import AttributeMapper, LazyAttributeMapper, TreeAttributeMapper
 from philo.validators import json_validator
 
 
-__all__ = ('value_content_type_limiter', 'register_value_model', 'unregister_value_model', 'JSONValue', 'ForeignKeyValue', 'ManyToManyValue', 'Attribute', 'Entity', 'TreeEntity', 'SlugTreeEntity')
+__all__ = ('value_content_type_limiter', 'register_value_model', 'unregister_value_model', 'JSONValue', 'ForeignKeyValue', 'ManyToManyValue', 'Attribute', 'prefetch_many_to_many_values', 'Entity', 'EntityQuerySet', 'EntityManager', 'TreeEntity', 'SlugTreeEntity')
+
+
+#: Whether :meth:`SlugTreeEntityManager.get_with_path` should resolve paths with a single query against :attr:`SlugTreeEntity.path_hash` instead of joining through each ancestor. This can be enabled by setting :setting:`PHILO_USE_PATH_HASHES` to ``True``.
+USE_PATH_HASHES = getattr(settings, 'PHILO_USE_PATH_HASHES', False)
+
+#: Whether :class:`.TreeAttributeMapper`\ s should read inherited :class:`Attribute`\ s from a cached map of each tree (see :func:`get_tree_attributes`) instead of querying for a :class:`TreeEntity`'s ancestors and their :class:`Attribute`\ s. The maps are shared between processes through the cache backend's versions, so this should only be enabled with a backend that all processes share. This can be enabled by setting :setting:`PHILO_CACHE_TREE_ATTRIBUTES` to ``True``.
+CACHE_TREE_ATTRIBUTES = getattr(settings, 'PHILO_CACHE_TREE_ATTRIBUTES', False)
+
+#: Whether :meth:`Attribute.set_value` should store JSON values in :attr:`Attribute.inline_value` instead of in a separate :class:`JSONValue`. Inline values are always read correctly, so this can be switched on at any time; existing values can be moved inline with :func:`inline_json_values`. This can be enabled by setting :setting:`PHILO_INLINE_JSON_VALUES` to ``True``.
+INLINE_JSON_VALUES = getattr(settings, 'PHILO_INLINE_JSON_VALUES', False)
 
 
 #: An instance of :class:`.ContentTypeRegistryLimiter` which is used to track the content types which can be related to by :class:`ForeignKeyValue`\ s and :class:`ManyToManyValue`\ s.
@@ -75,7 +93,7 @@ attribute_value_limiter = ContentTypeSubclassLimiter(AttributeValue)
 
 class JSONValue(AttributeValue):
 	"""Stores a python object as a json string."""
-	value = JSONField(verbose_name='Value (JSON)', help_text='This value must be valid JSON.', default='null', db_index=True)
+	value = JSONField(verbose_name='Value (JSON)', help_text='This value must be valid JSON.', default='null')
 	
 	def __unicode__(self):
 		return force_unicode(self.value)
@@ -140,12 +158,21 @@ class ManyToManyValue(AttributeValue):
 	values = models.ManyToManyField(ForeignKeyValue, blank=True, null=True)
 	
 	def get_object_ids(self):
+		if hasattr(self, '_prefetched_object_ids'):
+			return list(self._prefetched_object_ids)
 		return self.values.values_list('object_id', flat=True)
 	object_ids = property(get_object_ids)
 	
+	def _clear_prefetched_values(self):
+		# Forget any values filled in by prefetch_many_to_many_values.
+		self.__dict__.pop('_prefetched_object_ids', None)
+		self.__dict__.pop('_prefetched_objects', None)
+	
+	@commit_on_success_unless_managed
 	def set_value(self, value):
 		# Value must be a queryset. Watch out for ModelMultipleChoiceField;
 		# it returns its value as a list if empty.
+		self._clear_prefetched_values()
 		
 		self.content_type = ContentType.objects.get_for_model(value.model)
 		
@@ -154,33 +181,51 @@ class ManyToManyValue(AttributeValue):
 		if self.pk is None:
 			self.save()
 		
-		object_ids = value.values_list('id', flat=True)
+		object_ids = set(value.values_list('pk', flat=True))
 		
-		# These lines shouldn't be necessary; however, if object_ids is an EmptyQuerySet,
-		# the code (specifically the object_id__in query) won't work without them. Unclear why...
-		# TODO: is this still the case?
-		if not object_ids:
-			self.values.all().delete()
-		else:
-			self.values.exclude(object_id__in=object_ids, content_type=self.content_type).delete()
-			
-			current_ids = self.object_ids
-			
-			for object_id in object_ids:
-				if object_id in current_ids:
-					continue
-				self.values.create(content_type=self.content_type, object_id=object_id)
+		# Remove values which are no longer wanted with a single delete.
+		stale = self.values.all()
+		if object_ids:
+			stale = stale.exclude(content_type=self.content_type, object_id__in=object_ids)
+		stale_pks = set(stale.values_list('pk', flat=True))
+		if stale_pks:
+			through = self._meta.get_field('values').rel.through
+			models.signals.m2m_changed.send(sender=through, instance=self, action='pre_remove', reverse=False, model=ForeignKeyValue, pk_set=stale_pks, using=connection.alias)
+			ForeignKeyValue.objects.filter(pk__in=stale_pks).delete()
+			models.signals.m2m_changed.send(sender=through, instance=self, action='post_remove', reverse=False, model=ForeignKeyValue, pk_set=stale_pks, using=connection.alias)
+		
+		new_ids = object_ids - set(self.object_ids)
+		if new_ids:
+			self._add_values(new_ids)
+	
+	def _add_values(self, object_ids):
+		# The ForeignKeyValues are still created one at a time through the ORM,
+		# so that the pk of each one is known for certain. Rows inserted together
+		# could only be found again by their content type and object id, which
+		# ForeignKeyValues of other attributes may share. Only their rows in the
+		# through table are inserted with a single executemany.
+		value_pks = set([ForeignKeyValue.objects.create(content_type=self.content_type, object_id=object_id).pk for object_id in object_ids])
+		
+		qn = connection.ops.quote_name
+		field = self._meta.get_field('values')
+		models.signals.m2m_changed.send(sender=field.rel.through, instance=self, action='pre_add', reverse=False, model=ForeignKeyValue, pk_set=value_pks, using=connection.alias)
+		connection.cursor().executemany("INSERT INTO %s (%s, %s) VALUES (%%s, %%s)" % (qn(field.m2m_db_table()), qn(field.m2m_column_name()), qn(field.m2m_reverse_name())), [(self.pk, pk) for pk in value_pks])
+		transaction.set_dirty()
+		models.signals.m2m_changed.send(sender=field.rel.through, instance=self, action='post_add', reverse=False, model=ForeignKeyValue, pk_set=value_pks, using=connection.alias)
 	
 	def get_value(self):
-		if self.content_type is None:
+		if self.content_type_id is None:
 			return None
 		
 		# HACK to be safely explicit until http://code.djangoproject.com/ticket/15145 is resolved
-		object_ids = self.object_ids
-		manager = self.content_type.model_class()._default_manager
+		object_ids = list(self.object_ids)
+		manager = ContentType.objects.get_for_id(self.content_type_id).model_class()._default_manager
 		if not object_ids:
 			return manager.none()
-		return manager.filter(id__in=self.object_ids)
+		value = manager.filter(id__in=object_ids)
+		if hasattr(self, '_prefetched_objects'):
+			value._result_cache = list(self._prefetched_objects)
+		return value
 	
 	value = property(get_value, set_value)
 	
@@ -202,6 +247,7 @@ class ManyToManyValue(AttributeValue):
 		ct = kwargs.pop(field_name, None)
 		if ct is None or ct != self.content_type:
 			self.values.clear()
+			self._clear_prefetched_values()
 			self.content_type = ct
 		else:
 			value = kwargs.get('value', None)
@@ -236,29 +282,202 @@ class Attribute(models.Model):
 	#: :class:`CharField` containing a key (up to 255 characters) consisting of alphanumeric characters and underscores.
 	key = models.CharField(max_length=255, validators=[RegexValidator("\w+")], help_text="Must contain one or more alphanumeric characters or underscores.", db_index=True)
 	
+	#: :class:`~philo.models.fields.JSONField` containing the value of the :class:`Attribute` if it has no related :attr:`value`. See :data:`INLINE_JSON_VALUES`.
+	inline_value = JSONField(verbose_name='Inline value (JSON)', default='null', blank=True)
+	
 	def __unicode__(self):
+		if self.value_content_type_id is None:
+			return u'"%s": %s' % (self.key, force_unicode(self.inline_value))
 		return u'"%s": %s' % (self.key, self.value)
 	
 	def set_value(self, value, value_class=JSONValue):
-		"""Given a value and a value class, sets up self.value appropriately."""
-		if isinstance(self.value, value_class):
-			val = self.value
-		else:
-			if isinstance(self.value, models.Model):
-				self.value.delete()
-			val = value_class()
+		"""Given a value and a value class, sets up self.value appropriately. If ``value_class`` is :class:`JSONValue` and :data:`INLINE_JSON_VALUES` is ``True``, the value will be stored in :attr:`inline_value` instead, and any related :attr:`value` will be deleted."""
+		old_value = self.value if isinstance(self.value, models.Model) else None
 		
-		val.set_value(value)
-		val.save()
+		if value_class is JSONValue and INLINE_JSON_VALUES:
+			self.value = None
+			self.inline_value = value
+			self.save(force_update=self.pk is not None)
+		else:
+			if isinstance(old_value, value_class):
+				val, old_value = old_value, None
+			else:
+				val = value_class()
+			
+			val.set_value(value)
+			val.save(force_update=val.pk is not None)
+			
+			# The attribute itself only needs to be written if it now points at a
+			# different value.
+			if self.pk is None or self.inline_value is not None or self.value_content_type_id != ContentType.objects.get_for_model(val).pk or self.value_object_id != val.pk:
+				self.value = val
+				self.inline_value = None
+				self.save(force_update=self.pk is not None)
 		
-		self.value = val
-		self.save()
+		# Deleting a value deletes the attributes which point at it, so the old
+		# value is only deleted once this attribute points somewhere else.
+		if old_value is not None:
+			old_value.delete()
 	
 	class Meta:
 		app_label = 'philo'
 		unique_together = (('key', 'entity_content_type', 'entity_object_id'), ('value_content_type', 'value_object_id'))
 
 
+def prefetch_many_to_many_values(values):
+	"""Fetches the object ids of all of the :class:`ManyToManyValue`\ s in ``values`` with one query, and the objects themselves with one query per content type, so that their :attr:`~ManyToManyValue.value`\ s can be evaluated without any more queries. The prefetched objects are forgotten when a value is changed."""
+	values = [value for value in values if value.pk is not None]
+	if not values:
+		return
+	
+	object_ids = dict([(value.pk, []) for value in values])
+	for value_pk, object_id in ForeignKeyValue.objects.filter(manytomanyvalue__in=object_ids.keys()).values_list('manytomanyvalue', 'object_id'):
+		object_ids[value_pk].append(object_id)
+	
+	lookups = {}
+	for value in values:
+		if value.content_type_id is not None:
+			lookups.setdefault(value.content_type_id, set()).update(object_ids[value.pk])
+	
+	objects = {}
+	for ct_pk, pks in lookups.items():
+		if pks:
+			# Filtering rather than using in_bulk keeps the manager's ordering.
+			objects[ct_pk] = list(ContentType.objects.get_for_id(ct_pk).model_class()._default_manager.filter(pk__in=pks))
+	
+	for value in values:
+		value._prefetched_object_ids = object_ids[value.pk]
+		ids = set(object_ids[value.pk])
+		value._prefetched_objects = [obj for obj in objects.get(value.content_type_id, []) if obj.pk in ids]
+
+
+def get_attribute_values_bulk(attributes):
+	"""
+	Fetches the values of ``attributes`` with one query per value content type, the objects related to any :class:`ForeignKeyValue`\ s with one query per content type, and the contents of any :class:`ManyToManyValue`\ s (see :func:`prefetch_many_to_many_values`). Returns a dictionary mapping value content type ids to dictionaries of values by pk.
+	
+	"""
+	value_lookups = {}
+	for a in attributes:
+		if a.value_content_type_id is not None:
+			value_lookups.setdefault(a.value_content_type_id, []).append(a.value_object_id)
+	
+	values_bulk = {}
+	related_lookups = {}
+	fk_ct_pk = ContentType.objects.get_for_model(ForeignKeyValue).pk
+	for ct_pk, pks in value_lookups.items():
+		values_bulk[ct_pk] = ContentType.objects.get_for_id(ct_pk).model_class()._default_manager.in_bulk(pks)
+		if ct_pk == fk_ct_pk:
+			for value in values_bulk[ct_pk].values():
+				if value.content_type_id is not None and value.object_id is not None:
+					related_lookups.setdefault(value.content_type_id, []).append(value.object_id)
+	
+	if related_lookups:
+		related_bulk = dict([(ct_pk, ContentType.objects.get_for_id(ct_pk).model_class()._default_manager.in_bulk(pks)) for ct_pk, pks in related_lookups.items()])
+		cache_attr = ForeignKeyValue.value.cache_attr
+		for value in values_bulk[fk_ct_pk].values():
+			if value.content_type_id is not None and value.object_id is not None:
+				setattr(value, cache_attr, related_bulk[value.content_type_id].get(value.object_id))
+	
+	m2m_ct_pk = ContentType.objects.get_for_model(ManyToManyValue).pk
+	if m2m_ct_pk in values_bulk:
+		prefetch_many_to_many_values(values_bulk[m2m_ct_pk].values())
+	
+	return values_bulk
+
+
+def prefetch_attributes(entities):
+	"""
+	Fetches the :class:`Attribute`\ s of every :class:`Entity` in ``entities`` with one query per entity content type, fetches their values with one query per value content type, and fetches the objects related to :class:`ForeignKeyValue`\ s and :class:`ManyToManyValue`\ s with one query per content type. Each :class:`Entity` is then given an :attr:`~Entity.attributes` mapper whose cache is already filled, so accessing its attributes will not cause any more queries.
+	
+	Entities whose :attr:`~Entity.attributes` would inherit :class:`Attribute`\ s from other entities - for example, :class:`TreeEntity` instances with a parent - are left alone.
+	
+	"""
+	mappers = {}
+	for entity in entities:
+		mapper = entity.get_attribute_mapper()
+		if type(mapper) in (AttributeMapper, LazyAttributeMapper):
+			ct = ContentType.objects.get_for_model(entity)
+			mappers.setdefault(ct.pk, {})[entity.pk] = mapper
+	
+	attributes = {}
+	for ct_pk, ct_mappers in mappers.items():
+		for a in Attribute.objects.filter(entity_content_type=ct_pk, entity_object_id__in=ct_mappers.keys()):
+			attributes.setdefault((ct_pk, a.entity_object_id), []).append(a)
+	
+	values_bulk = get_attribute_values_bulk(chain(*attributes.values()))
+	
+	for ct_pk, ct_mappers in mappers.items():
+		for pk, mapper in ct_mappers.items():
+			mapper.clear_cache()
+			mapper._fill_cache_from_bulk(attributes.get((ct_pk, pk), []), values_bulk)
+			mapper.entity._attributes = mapper
+
+
+class EntityQuerySet(QuerySet):
+	_prefetch_attributes = False
+	
+	def prefetch_attributes(self):
+		"""Returns a copy of the :class:`QuerySet` which will fetch the :class:`Attribute`\ s of all its :class:`Entity` instances in bulk when it is evaluated. See :func:`prefetch_attributes`."""
+		return self._clone(_prefetch_attributes=True)
+	
+	def _clone(self, *args, **kwargs):
+		kwargs.setdefault('_prefetch_attributes', self._prefetch_attributes)
+		return super(EntityQuerySet, self)._clone(*args, **kwargs)
+	
+	def iterator(self):
+		if not self._prefetch_attributes:
+			return super(EntityQuerySet, self).iterator()
+		entities = list(super(EntityQuerySet, self).iterator())
+		prefetch_attributes(entities)
+		return iter(entities)
+
+
+class EntityManager(models.Manager):
+	def get_query_set(self):
+		return EntityQuerySet(self.model, using=self._db)
+	
+	def prefetch_attributes(self):
+		"""Returns a :class:`QuerySet` of all instances of the model which will fetch their :class:`Attribute`\ s in bulk. See :meth:`EntityQuerySet.prefetch_attributes`."""
+		return self.get_query_set().prefetch_attributes()
+
+
+@commit_on_success_unless_managed
+def inline_json_values(attributes=None):
+	"""
+	Moves the values of :class:`Attribute`\ s whose :attr:`~Attribute.value` is a :class:`JSONValue` into :attr:`Attribute.inline_value` and deletes the :class:`JSONValue`\ s. This can be used to migrate existing data after enabling :data:`INLINE_JSON_VALUES`.
+	
+	:param attributes: A :class:`QuerySet` of :class:`Attribute`\ s to convert. Defaults to all :class:`Attribute`\ s.
+	:returns: The number of :class:`Attribute`\ s converted.
+	
+	"""
+	if attributes is None:
+		attributes = Attribute.objects.all()
+	
+	attributes = attributes.filter(value_content_type=ContentType.objects.get_for_model(JSONValue))
+	values = JSONValue.objects.filter(pk__in=attributes.values('value_object_id'))
+	value_json = dict(values.values_list('pk', 'value_json'))
+	
+	count = 0
+	entities = {}
+	for pk, value_object_id, entity_content_type_id, entity_object_id in attributes.values_list('pk', 'value_object_id', 'entity_content_type', 'entity_object_id'):
+		Attribute.objects.filter(pk=pk).update(value_content_type=None, value_object_id=None, inline_value=value_json.get(value_object_id, 'null'))
+		entities.setdefault(entity_content_type_id, set()).add(entity_object_id)
+		count += 1
+	JSONValue.objects.filter(pk__in=value_json.keys()).delete()
+	
+	# The updates don't send any signals, so the caches which would otherwise
+	# still point at the deleted values are invalidated here.
+	from philo.models.nodes import content_cache
+	content_cache.invalidate()
+	if CACHE_TREE_ATTRIBUTES:
+		for content_type_id, pks in entities.items():
+			model = ContentType.objects.get_for_id(content_type_id).model_class()
+			if model is not None and issubclass(model, TreeEntity):
+				for tree_id in set(model._default_manager.filter(pk__in=pks).values_list(model._mptt_meta.tree_id_attr, flat=True)):
+					_get_tree_attribute_cache(content_type_id, tree_id).invalidate()
+	return count
+
+
 class EntityOptions(object):
 	def __init__(self, options):
 		if options is not None:
@@ -274,6 +493,17 @@ class EntityOptions(object):
 class EntityBase(models.base.ModelBase):
 	def __new__(cls, name, bases, attrs):
 		entity_meta = attrs.pop('EntityMeta', None)
+		
+		# Concrete entity models which would otherwise get django's automatic
+		# ``objects`` manager get an EntityManager instead. Models which
+		# declare or inherit managers of their own keep them as their defaults.
+		meta = attrs.get('Meta')
+		if not getattr(meta, 'abstract', False) and not getattr(meta, 'proxy', False):
+			declared = [value for value in attrs.values() if isinstance(value, models.Manager)]
+			inherited = [base for base in bases if hasattr(base, '_meta') and base._meta.abstract and base._meta.abstract_managers]
+			if not declared and not inherited:
+				attrs['objects'] = EntityManager()
+		
 		new = super(EntityBase, cls).__new__(cls, name, bases, attrs)
 		new.add_to_class('_entity_meta', EntityOptions(entity_meta))
 		entity_class_prepared.send(sender=new)
@@ -281,7 +511,7 @@ class EntityBase(models.base.ModelBase):
 
 
 class Entity(models.Model):
-	"""An abstract class that simplifies access to related attributes. Most models provided by Philo subclass Entity."""
+	"""An abstract class that simplifies access to related attributes. Most models provided by Philo subclass Entity. Concrete subclasses which don't declare or inherit a manager get an :class:`EntityManager` as ``objects``."""
 	__metaclass__ = EntityBase
 	
 	attribute_set = generic.GenericRelation(Attribute, content_type_field='entity_content_type', object_id_field='entity_object_id')
@@ -319,7 +549,7 @@ class TreeEntityBase(MPTTModelBase, EntityBase):
 		return meta.register(cls)
 
 
-class TreeEntityManager(models.Manager):
+class TreeEntityManager(EntityManager):
 	use_for_related_fields = True
 	
 	def get_with_path(self, path, root=None, absolute_result=True, pathsep='/', field='pk'):
@@ -430,6 +660,71 @@ class TreeEntityManager(models.Manager):
 		# of the path, since short paths are more likely, but how far forward? It would
 		# need to shift depending on len(segments) - perhaps logarithmically?
 		return find_obj(segments, len(segments)/2 or len(segments))
+	
+	def annotate_paths(self, entities, root=None, pathsep='/', field='pk'):
+		"""
+		Computes the paths of all of ``entities`` - which may be a queryset or any iterable of instances - with one query per tree, and stores them in each instance's memo so that calls to :meth:`~TreeEntity.get_path` with the same arguments will not cause any queries. Entities which are not descendants of ``root`` are left alone.
+		
+		:param entities: The instances whose paths should be computed.
+		:param root: Only compute the paths since this object.
+		:param pathsep: The path separator to use when constructing the paths.
+		:param field: The field to pull path information from for each ancestor.
+		:returns: A list of the instances.
+		
+		"""
+		entities = list(entities)
+		opts = self.model._mptt_meta
+		parent_attname = "%s_id" % opts.parent_attr
+		root_id = getattr(root, 'pk', None)
+		
+		trees = {}
+		for entity in entities:
+			if entity.pk is None or root is not None and (entity == root or not entity.is_descendant_of(root)):
+				continue
+			trees.setdefault(getattr(entity, opts.tree_id_attr), []).append(entity)
+		
+		for tree_id, tree_entities in trees.items():
+			# Fetch exactly the union of the entities' ancestors: one condition
+			# per distinct entity, each selecting the rows which enclose it.
+			bounds = set([(getattr(entity, opts.left_attr), getattr(entity, opts.right_attr)) for entity in tree_entities])
+			ancestors = reduce(operator.or_, [Q(**{'%s__lte' % opts.left_attr: left, '%s__gte' % opts.right_attr: right}) for left, right in bounds])
+			kwargs = {opts.tree_id_attr: tree_id}
+			if root is not None:
+				kwargs['%s__gt' % opts.level_attr] = root.get_level()
+			
+			parents = {}
+			values = {}
+			for pk, parent_id, value in self.model._default_manager.filter(ancestors, **kwargs).values_list('pk', parent_attname, field):
+				parents[pk] = parent_id
+				values[pk] = value
+			
+			paths = {}
+			for entity in tree_entities:
+				segments = []
+				pk = entity.pk
+				while pk != root_id:
+					if pk not in parents:
+						break
+					if pk in paths:
+						segments.append(paths[pk])
+						pk = root_id
+						break
+					segments.append(unicode(values[pk]))
+					pk = parents[pk]
+				if pk != root_id:
+					continue
+				
+				segments.reverse()
+				path = pathsep.join(segments)
+				paths[entity.pk] = path
+				
+				memo_args = (getattr(entity, parent_attname), root_id, pathsep, getattr(entity, field, '?'))
+				try:
+					entity._path_memo[memo_args] = path
+				except AttributeError:
+					entity._path_memo = {memo_args: path}
+		
+		return entities
 
 
 class TreeEntity(Entity, MPTTModel):
@@ -510,19 +805,212 @@ class TreeEntity(Entity, MPTTModel):
 		abstract = True
 
 
+_tree_attribute_caches = {}
+
+
+def _get_tree_attribute_cache(content_type_id, tree_id):
+	key = (content_type_id, tree_id)
+	if key not in _tree_attribute_caches:
+		_tree_attribute_caches[key] = VersionedCache('tree_attributes_%s_%s' % key)
+	return _tree_attribute_caches[key]
+
+
+def _build_tree_attribute_map(model, content_type_id, tree_id):
+	opts = model._mptt_meta
+	tree = model._default_manager.filter(**{opts.tree_id_attr: tree_id})
+	parents = dict(tree.values_list('pk', opts.parent_attr))
+	
+	attributes = {}
+	rows = Attribute.objects.filter(entity_content_type=content_type_id, entity_object_id__in=tree.values('pk')).values_list('pk', 'entity_object_id', 'key', 'value_content_type', 'value_object_id', 'inline_value_json')
+	for row in rows:
+		attributes.setdefault(row[1], {})[row[2]] = row
+	return parents, attributes
+
+
+def get_tree_attributes(entity):
+	"""
+	Returns a dictionary mapping keys to :class:`Attribute`\ s which are related to ``entity`` - a saved :class:`TreeEntity` - or inherited from its ancestors, with the :class:`Attribute`\ s closest to ``entity`` taking precedence.
+	
+	The parents and :class:`Attribute`\ s of every entity in ``entity``'s tree are fetched with two queries the first time they are needed and are kept until an :class:`Attribute` of an entity in the tree is saved or deleted or until an entity in the tree is saved, deleted, or moved. The resolved map for each entity is computed once from those and the :class:`Attribute`\ s are returned as new instances, so their values can safely be cached on them.
+	
+	"""
+	model = entity.__class__
+	content_type_id = ContentType.objects.get_for_model(model).pk
+	tree_id = getattr(entity, entity._mptt_meta.tree_id_attr)
+	tree_cache = _get_tree_attribute_cache(content_type_id, tree_id)
+	
+	resolved = tree_cache.get(entity.pk)
+	if resolved is None:
+		tree = tree_cache.get('tree')
+		if tree is None or entity.pk not in tree[0]:
+			tree = _build_tree_attribute_map(model, content_type_id, tree_id)
+			tree_cache.set('tree', tree)
+		parents, attributes = tree
+		
+		lineage = []
+		pk = entity.pk
+		while pk is not None:
+			lineage.append(pk)
+			pk = parents.get(pk)
+		
+		resolved = {}
+		for pk in reversed(lineage):
+			resolved.update(attributes.get(pk, {}))
+		tree_cache.set(entity.pk, resolved)
+	
+	attributes = {}
+	for pk, entity_object_id, key, value_content_type_id, value_object_id, inline_value_json in resolved.values():
+		attributes[key] = Attribute(pk=pk, entity_content_type_id=content_type_id, entity_object_id=entity_object_id, key=key, value_content_type_id=value_content_type_id, value_object_id=value_object_id, inline_value_json=inline_value_json)
+	return attributes
+
+
+def invalidate_tree_attributes(sender, instance, **kwargs):
+	if sender is Attribute:
+		model = ContentType.objects.get_for_id(instance.entity_content_type_id).model_class()
+		if model is None or not issubclass(model, TreeEntity):
+			return
+		tree_ids = model._default_manager.filter(pk=instance.entity_object_id).values_list(model._mptt_meta.tree_id_attr, flat=True)
+	elif issubclass(sender, TreeEntity):
+		model = sender
+		tree_ids = [getattr(instance, model._mptt_meta.tree_id_attr)]
+	else:
+		return
+	
+	content_type_id = ContentType.objects.get_for_model(model).pk
+	for tree_id in tree_ids:
+		_get_tree_attribute_cache(content_type_id, tree_id).invalidate()
+
+
+if CACHE_TREE_ATTRIBUTES:
+	models.signals.post_save.connect(invalidate_tree_attributes)
+	models.signals.post_delete.connect(invalidate_tree_attributes)
+	
+	try:
+		from mptt.signals import node_moved
+	except ImportError:
+		pass
+	else:
+		node_moved.connect(invalidate_tree_attributes)
+
+
+def make_path_hash(path):
+	"""Returns the value stored in :attr:`SlugTreeEntity.path_hash` for a ``/``-separated slug ``path``."""
+	return sha1(smart_str(path)).hexdigest()
+
+
 class SlugTreeEntityManager(TreeEntityManager):
-	def get_with_path(self, path, root=None, absolute_result=True, pathsep='/', field='slug'):
-		return super(SlugTreeEntityManager, self).get_with_path(path, root, absolute_result, pathsep, field)
+	def get_with_path(self, path, root=None, absolute_result=True, pathsep='/', field='slug', use_path_hashes=None):
+		"""
+		Works the same as :meth:`TreeEntityManager.get_with_path`, except that if ``use_path_hashes`` is ``True`` (or if it is ``None`` and :data:`USE_PATH_HASHES` is ``True``) and the path is being matched against slugs, the object will be looked up with a single indexed query against :attr:`SlugTreeEntity.path_hash` regardless of the depth of the path.
+		
+		"""
+		if use_path_hashes is None:
+			use_path_hashes = USE_PATH_HASHES
+		
+		if not use_path_hashes or field != 'slug':
+			return super(SlugTreeEntityManager, self).get_with_path(path, root, absolute_result, pathsep, field)
+		
+		segments = [segment for segment in path.split(pathsep) if segment]
+		
+		if not segments:
+			if root is not None:
+				if absolute_result:
+					return root
+				return root, None
+			else:
+				raise self.model.DoesNotExist('%s matching query does not exist.' % self.model._meta.object_name)
+		
+		if root is None:
+			prefix = ''
+		else:
+			prefix = root.get_path() + '/'
+		
+		if absolute_result:
+			return self.get(path_hash=make_path_hash(prefix + '/'.join(segments)))
+		
+		hashes = [make_path_hash(prefix + '/'.join(segments[:i])) for i in xrange(1, len(segments) + 1)]
+		level_attr = self.model._mptt_meta.level_attr
+		
+		try:
+			obj = self.filter(path_hash__in=hashes).order_by('-%s' % level_attr)[0]
+		except IndexError:
+			if root is not None:
+				return root, pathsep.join(segments)
+			raise self.model.DoesNotExist('%s matching query does not exist.' % self.model._meta.object_name)
+		
+		if root is None:
+			depth = obj.get_level() + 1
+		else:
+			depth = obj.get_level() - root.get_level()
+		
+		return obj, pathsep.join(segments[depth:]) or None
+	
+	def annotate_paths(self, entities, root=None, pathsep='/', field='slug'):
+		return super(SlugTreeEntityManager, self).annotate_paths(entities, root, pathsep, field)
+	
+	def rebuild_path_hashes(self):
+		"""Recalculates :attr:`SlugTreeEntity.path_hash` for every instance. This only needs to be run if the tree has been modified without going through :meth:`SlugTreeEntity.save` or :meth:`SlugTreeEntity.move_to` -- for example, by loading fixtures."""
+		opts = self.model._mptt_meta
+		parent_attname = "%s_id" % opts.parent_attr
+		paths = {}
+		
+		for pk, parent_id, slug, path_hash in self.order_by(opts.tree_id_attr, opts.left_attr).values_list('pk', parent_attname, 'slug', 'path_hash'):
+			if parent_id is None:
+				paths[pk] = slug
+			else:
+				paths[pk] = '/'.join((paths[parent_id], slug))
+			new_hash = make_path_hash(paths[pk])
+			if new_hash != path_hash:
+				self.filter(pk=pk).update(path_hash=new_hash)
 
 
 class SlugTreeEntity(TreeEntity):
 	objects = SlugTreeEntityManager()
 	slug = models.SlugField(max_length=255)
+	#: A :class:`CharField` containing a hash of the instance's slug path from the root of its tree. This is kept up to date by :meth:`save` and :meth:`move_to` and is used by :meth:`SlugTreeEntityManager.get_with_path` to find instances with a single indexed query.
+	path_hash = models.CharField(max_length=40, db_index=True, editable=False, blank=True)
 	
 	def get_path(self, root=None, pathsep='/', field='slug', memoize=True):
 		return super(SlugTreeEntity, self).get_path(root, pathsep, field, memoize)
 	path = property(get_path)
 	
+	def _get_slug_path(self):
+		parent = getattr(self, self._mptt_meta.parent_attr)
+		if parent is None:
+			return self.slug
+		return '/'.join((parent.get_path(memoize=False), self.slug))
+	
+	def _update_descendant_path_hashes(self, path):
+		parent_attname = "%s_id" % self._mptt_meta.parent_attr
+		manager = self.__class__._default_manager
+		paths = {self.pk: path}
+		
+		for pk, parent_id, slug in self.get_descendants().values_list('pk', parent_attname, 'slug'):
+			paths[pk] = '/'.join((paths[parent_id], slug))
+			manager.filter(pk=pk).update(path_hash=make_path_hash(paths[pk]))
+	
+	def save(self, *args, **kwargs):
+		old_hash = self.path_hash
+		existed = self.pk is not None
+		path = self._get_slug_path()
+		self.path_hash = make_path_hash(path)
+		super(SlugTreeEntity, self).save(*args, **kwargs)
+		
+		# A blank hash on an existing instance - for example, one loaded from
+		# fixtures - says nothing about its descendants, so they are rebuilt.
+		if old_hash != self.path_hash and (old_hash or existed):
+			self._update_descendant_path_hashes(path)
+	
+	def move_to(self, target, position='first-child'):
+		super(SlugTreeEntity, self).move_to(target, position)
+		path = self._get_slug_path()
+		path_hash = make_path_hash(path)
+		
+		if path_hash != self.path_hash:
+			self.path_hash = path_hash
+			self.__class__._default_manager.filter(pk=self.pk).update(path_hash=path_hash)
+			self._update_descendant_path_hashes(path)
+	
 	def clean(self):
 		if getattr(self, "%s_id" % self._mptt_meta.parent_attr) is None:
 			try:
@@ -1,12 +1,14 @@
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_slug
 from django.db import models
-from django.utils import simplejson as json
+from django.utils.importlib import import_module
 from django.utils.text import capfirst
 from django.utils.translation import ugettext_lazy as _
 
 from philo.forms.fields import JSONFormField
+from philo.utils.cache import LRUCache
 from philo.utils.registry import RegistryIterator
 from philo.validators import TemplateValidator, json_validator
 #from philo.models.fields.entities import *
@@ -19,27 +21,97 @@ class TemplateField(models.TextField):
 		self.validators.append(TemplateValidator(allow, disallow, secure))
 
 
+#: The module used to encode and decode the values of :class:`JSONField`\ s. It must provide ``loads`` and ``dumps`` functions which behave like those of :mod:`json`. A faster implementation can be used by setting :setting:`PHILO_JSON_CODEC` to its import path; by default, :mod:`django.utils.simplejson` is used.
+json_codec = import_module(getattr(settings, 'PHILO_JSON_CODEC', 'django.utils.simplejson'))
+
+#: Holds decoded :class:`JSONField` values by their json strings, so that identical strings - for example, boolean flags or small dictionaries repeated across many :class:`.JSONValue`\ s - are only decoded once. The number of strings held can be set with :setting:`PHILO_JSON_PARSE_CACHE_SIZE`.
+json_parse_cache = LRUCache(getattr(settings, 'PHILO_JSON_PARSE_CACHE_SIZE', 1000))
+
+#: json strings longer than this are not added to the :data:`json_parse_cache`.
+JSON_PARSE_CACHE_MAX_LENGTH = 1024
+
+_MISSING = object()
+
+
+def _copy_json(value):
+	# Decoded json values only contain dicts and lists as mutable containers.
+	if isinstance(value, dict):
+		return dict([(k, _copy_json(v)) for k, v in value.iteritems()])
+	if isinstance(value, list):
+		return [_copy_json(v) for v in value]
+	return value
+
+
+def _json_equal(value1, value2):
+	# Stricter than ==, which would consider i.e. 1, 1.0, and True to be equal.
+	if type(value1) is not type(value2):
+		return False
+	if isinstance(value1, dict):
+		if len(value1) != len(value2):
+			return False
+		for k, v in value1.iteritems():
+			if k not in value2 or not _json_equal(v, value2[k]):
+				return False
+		return True
+	if isinstance(value1, list):
+		if len(value1) != len(value2):
+			return False
+		for v1, v2 in zip(value1, value2):
+			if not _json_equal(v1, v2):
+				return False
+		return True
+	return value1 == value2
+
+
+def loads_json(json_string):
+	"""Decodes ``json_string`` with the :data:`json_codec`, using the :data:`json_parse_cache` if possible. A copy of any cached value is returned, so changes to the returned value won't affect the cache."""
+	if json_string is None or len(json_string) > JSON_PARSE_CACHE_MAX_LENGTH:
+		return json_codec.loads(json_string)
+	
+	value = json_parse_cache.get(json_string, _MISSING)
+	if value is _MISSING:
+		value = json_codec.loads(json_string)
+		json_parse_cache.set(json_string, value)
+	return _copy_json(value)
+
+
 class JSONDescriptor(object):
 	def __init__(self, field):
 		self.field = field
 	
+	def _source_key(self):
+		# Where the json string that the instance's value was decoded from (or
+		# encoded to) is kept.
+		return '_%s_source' % self.field.attname
+	
 	def __get__(self, instance, owner):
 		if instance is None:
 			raise AttributeError # ?
 		
 		if self.field.name not in instance.__dict__:
 			json_string = getattr(instance, self.field.attname)
-			instance.__dict__[self.field.name] = json.loads(json_string)
+			instance.__dict__[self.field.name] = loads_json(json_string)
+			instance.__dict__[self._source_key()] = json_string
 		
 		return instance.__dict__[self.field.name]
 	
 	def __set__(self, instance, value):
 		instance.__dict__[self.field.name] = value
-		setattr(instance, self.field.attname, json.dumps(value))
+		
+		# If the json string is still the one the current value came from and it
+		# decodes to the new value, there's no need to encode it again.
+		json_string = instance.__dict__.get(self._source_key())
+		if json_string is not None and json_string == getattr(instance, self.field.attname, None) and _json_equal(loads_json(json_string), value):
+			return
+		
+		json_string = json_codec.dumps(value)
+		setattr(instance, self.field.attname, json_string)
+		instance.__dict__[self._source_key()] = json_string
 	
 	def __delete__(self, instance):
 		del(instance.__dict__[self.field.name])
-		setattr(instance, self.field.attname, json.dumps(None))
+		instance.__dict__.pop(self._source_key(), None)
+		setattr(instance, self.field.attname, json_codec.dumps(None))
 
 
 class JSONField(models.TextField):
@@ -2,13 +2,18 @@ import datetime
 from itertools import tee
 
 from django import forms
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import FieldError
 from django.db import models
 from django.db.models.fields import NOT_PROVIDED
 from django.utils.text import capfirst
 
 from philo.models import ManyToManyValue, JSONValue, ForeignKeyValue, Attribute, Entity
+from philo.models import base
+from philo.models.base import get_attribute_values_bulk
+from philo.models.fields import _json_equal
 from philo.signals import entity_class_prepared
+from philo.utils import commit_on_success_unless_managed
 
 
 __all__ = ('JSONAttribute', 'ForeignKeyAttribute', 'ManyToManyAttribute')
@@ -144,24 +149,65 @@ class AttributeFieldDescriptor(object):
 
 
 def process_attribute_fields(sender, instance, created, **kwargs):
-	"""This function is attached to each :class:`Entity` subclass's post_save signal. Any :class:`Attribute`\ s managed by :class:`AttributeProxyField`\ s which have been removed will be deleted, and any new attributes will be created."""
+	"""This function is attached to each :class:`Entity` subclass's post_save signal. Any :class:`Attribute`\ s managed by :class:`AttributeProxyField`\ s which have been removed will be deleted, and any new attributes will be created. All of the changes are made in a single transaction."""
 	if ATTRIBUTE_REGISTRY in instance.__dict__:
 		registry = instance.__dict__[ATTRIBUTE_REGISTRY]
-		instance.attribute_set.filter(key__in=[field.attribute_key for field in registry['removed']]).delete()
-		
-		for field in registry['added']:
-			# TODO: Should this perhaps just use instance.attributes[field.attribute_key] = getattr(instance, field.name, None)?
-			# (Would eliminate the need for field.value_class.)
-			try:
-				attribute = instance.attribute_set.get(key=field.attribute_key)
-			except Attribute.DoesNotExist:
-				attribute = Attribute()
-				attribute.entity = instance
-				attribute.key = field.attribute_key
-			attribute.set_value(value=getattr(instance, field.name, None), value_class=field.value_class)
+		save_attribute_fields(instance, registry['added'], registry['removed'])
 		del instance.__dict__[ATTRIBUTE_REGISTRY]
 
 
+@commit_on_success_unless_managed
+def save_attribute_fields(instance, added, removed):
+	"""
+	Writes the values of the ``added`` :class:`AttributeProxyField`\ s of ``instance`` back to its :class:`Attribute`\ s and deletes the :class:`Attribute`\ s of the ``removed`` fields. The existing :class:`Attribute`\ s are fetched with a single query and their values with one query per value type, and fields whose stored value hasn't changed aren't written at all.
+	
+	"""
+	if removed:
+		instance.attribute_set.filter(key__in=[field.attribute_key for field in removed]).delete()
+	
+	if not added:
+		return
+	
+	attributes = dict([(attribute.key, attribute) for attribute in instance.attribute_set.filter(key__in=[field.attribute_key for field in added])])
+	values_bulk = get_attribute_values_bulk(attributes.values())
+	cache_attr = Attribute.value.cache_attr
+	for attribute in attributes.values():
+		if attribute.value_content_type_id is not None:
+			setattr(attribute, cache_attr, values_bulk[attribute.value_content_type_id].get(attribute.value_object_id))
+	
+	for field in added:
+		# TODO: Should this perhaps just use instance.attributes[field.attribute_key] = getattr(instance, field.name, None)?
+		# (Would eliminate the need for field.value_class.)
+		value = getattr(instance, field.name, None)
+		try:
+			attribute = attributes[field.attribute_key]
+		except KeyError:
+			attribute = Attribute()
+			attribute.entity = instance
+			attribute.key = field.attribute_key
+		else:
+			if is_stored_value(attribute, value, field.value_class):
+				continue
+		attribute.set_value(value=value, value_class=field.value_class)
+	
+	# Any attributes cached on the instance are now out of date.
+	if '_attributes' in instance.__dict__:
+		del instance.__dict__['_attributes']
+
+
+def is_stored_value(attribute, value, value_class):
+	"""Returns ``True`` if ``attribute`` already stores ``value`` as an instance of ``value_class`` (or inline, for :class:`.JSONValue`\ s) and ``False`` otherwise. :class:`.ManyToManyValue`\ s are never considered stored, since :meth:`.ManyToManyValue.set_value` only writes the differences anyway."""
+	if value_class is JSONValue:
+		if attribute.value_content_type_id is None:
+			return base.INLINE_JSON_VALUES and _json_equal(attribute.inline_value, value)
+		return not base.INLINE_JSON_VALUES and isinstance(attribute.value, JSONValue) and _json_equal(attribute.value.value, value)
+	if value_class is ForeignKeyValue and isinstance(attribute.value, ForeignKeyValue):
+		if value is None:
+			return attribute.value.content_type_id is None and attribute.value.object_id is None
+		return attribute.value.content_type_id == ContentType.objects.get_for_model(value).pk and attribute.value.object_id == value.pk
+	return False
+
+
 class JSONAttribute(AttributeProxyField):
 	"""
 	Handles an :class:`.Attribute` with a :class:`.JSONValue`.
@@ -1,6 +1,10 @@
+from copy import copy
 from inspect import getargspec
+from mimetools import choose_boundary
 import mimetypes
 from os.path import basename
+from threading import local
+from time import mktime, time
 
 from django.conf import settings
 from django.contrib.contenttypes import generic
@@ -9,18 +13,28 @@ from django.contrib.sites.models import Site, RequestSite
 from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.servers.basehttp import FileWrapper
-from django.core.urlresolvers import resolve, clear_url_caches, reverse, NoReverseMatch
+from django.core.urlresolvers import RegexURLResolver, get_script_prefix, reverse, NoReverseMatch
 from django.db import models
-from django.http import HttpResponse, HttpResponseServerError, HttpResponseRedirect, Http404
-from django.utils.encoding import smart_str
+from django.http import HttpResponse, HttpResponseServerError, HttpResponseRedirect, HttpResponseNotModified, Http404
+from django.utils.cache import get_cache_key, learn_cache_key, patch_vary_headers
+from django.utils.encoding import force_unicode, iri_to_uri, smart_str
+from django.utils.hashcompat import md5_constructor
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
 
 from philo.exceptions import MIDDLEWARE_NOT_CONFIGURED, ViewCanNotProvideSubpath, ViewDoesNotProvideSubpaths
-from philo.models.base import SlugTreeEntity, Entity, register_value_model
+from philo.models.base import SlugTreeEntity, SlugTreeEntityManager, Entity, EntityQuerySet, register_value_model
 from philo.models.fields import JSONField
 from philo.utils import ContentTypeSubclassLimiter
+from philo.utils.cache import LRUCache, VersionedCache
 from philo.utils.entities import LazyPassthroughAttributeMapper
+from philo.utils.http import parse_range_header, iter_file_range
 from philo.signals import view_about_to_render, view_finished_rendering
 
+try:
+	from mptt.signals import node_moved
+except ImportError:
+	node_moved = None
+
 
 __all__ = ('Node', 'View', 'MultiView', 'Redirect', 'File')
 
@@ -28,35 +42,100 @@ __all__ = ('Node', 'View', 'MultiView', 'Redirect', 'File')
 _view_content_type_limiter = ContentTypeSubclassLimiter(None)
 CACHE_PHILO_ROOT = getattr(settings, "PHILO_CACHE_PHILO_ROOT", True)
 
+#: How :class:`File` views hand the sending of files over to the front-end server. If this is ``None``, files are streamed from python. If it is ``'x-sendfile'``, responses will instead contain an ``X-Sendfile`` header with the path of the file (for i.e. Apache with mod_xsendfile, or lighttpd); if it is ``'x-accel-redirect'``, they will contain an ``X-Accel-Redirect`` header with :data:`FILE_ACCEL_REDIRECT_PREFIX` followed by the name of the file (for nginx). This can be set with :setting:`PHILO_FILE_OFFLOAD`.
+FILE_OFFLOAD = getattr(settings, 'PHILO_FILE_OFFLOAD', None)
+
+#: The internal location beneath which nginx serves the files of :class:`File` views when :data:`FILE_OFFLOAD` is ``'x-accel-redirect'``. This can be set with :setting:`PHILO_FILE_ACCEL_REDIRECT_PREFIX`.
+FILE_ACCEL_REDIRECT_PREFIX = getattr(settings, 'PHILO_FILE_ACCEL_REDIRECT_PREFIX', '/protected/')
+
+#: The largest number of byte ranges which :class:`File` views will answer in a single request. Requests whose ``Range`` header lists more are sent the whole file instead. This can be set with :setting:`PHILO_FILE_MAX_RANGES`.
+FILE_MAX_RANGES = getattr(settings, 'PHILO_FILE_MAX_RANGES', 20)
+
+
+def prefetch_views(nodes):
+	"""Fetches the :attr:`~Node.view` of each :class:`Node` in ``nodes`` using one query per view content type and caches it on the :class:`Node`, so that accessing :attr:`Node.view` will not cause another query."""
+	lookups = {}
+	for node in nodes:
+		if node.view_object_id and node.view_content_type_id:
+			lookups.setdefault(node.view_content_type_id, set()).add(node.view_object_id)
+	
+	views = {}
+	for ct_id, pks in lookups.items():
+		view_model = ContentType.objects.get_for_id(ct_id).model_class()
+		views[ct_id] = view_model._default_manager.in_bulk(list(pks))
+	
+	cache_attr = Node.view.cache_attr
+	for node in nodes:
+		view = views.get(node.view_content_type_id, {}).get(node.view_object_id)
+		if view is not None:
+			setattr(node, cache_attr, view)
+
+
+class NodeQuerySet(EntityQuerySet):
+	_prefetch_views = False
+	
+	def prefetch_views(self):
+		"""Returns a copy of the :class:`QuerySet` which will fetch the :attr:`~Node.view`\ s of all its :class:`Node`\ s with one query per view content type when it is evaluated."""
+		return self._clone(_prefetch_views=True)
+	
+	def _clone(self, *args, **kwargs):
+		kwargs.setdefault('_prefetch_views', self._prefetch_views)
+		return super(NodeQuerySet, self)._clone(*args, **kwargs)
+	
+	def iterator(self):
+		if not self._prefetch_views:
+			return super(NodeQuerySet, self).iterator()
+		nodes = list(super(NodeQuerySet, self).iterator())
+		prefetch_views(nodes)
+		return iter(nodes)
+
+
+class NodeManager(SlugTreeEntityManager):
+	def get_query_set(self):
+		return NodeQuerySet(self.model, using=self._db)
+	
+	def prefetch_views(self):
+		"""Returns a :class:`QuerySet` of all :class:`Node`\ s which will fetch their :attr:`~Node.view`\ s in bulk. See :meth:`NodeQuerySet.prefetch_views`."""
+		return self.get_query_set().prefetch_views()
+
 
 class Node(SlugTreeEntity):
 	"""
 	:class:`Node`\ s are the basic building blocks of a website using Philo. They define the URL hierarchy and connect each URL to a :class:`View` subclass instance which is used to generate an HttpResponse.
 	
 	"""
+	objects = NodeManager()
 	view_content_type = models.ForeignKey(ContentType, related_name='node_view_set', limit_choices_to=_view_content_type_limiter, blank=True, null=True)
 	view_object_id = models.PositiveIntegerField(blank=True, null=True)
 	#: :class:`GenericForeignKey` to a non-abstract subclass of :class:`View`
 	view = generic.GenericForeignKey('view_content_type', 'view_object_id')
 	
+	def get_view_model(self):
+		"""Returns the :class:`View` subclass of :attr:`view` without fetching :attr:`view`, or ``None`` if no view has been set."""
+		if self.view_object_id and self.view_content_type_id:
+			return ContentType.objects.get_for_id(self.view_content_type_id).model_class()
+		return None
+	
 	@property
 	def accepts_subpath(self):
 		"""A property shortcut for :attr:`self.view.accepts_subpath <View.accepts_subpath>`"""
-		if self.view_object_id and self.view_content_type_id:
-			return ContentType.objects.get_for_id(self.view_content_type_id).model_class().accepts_subpath
+		view_model = self.get_view_model()
+		if view_model is not None:
+			return view_model.accepts_subpath
 		return False
 	
 	def handles_subpath(self, subpath):
-		if self.view_object_id and self.view_content_type_id:
-			return ContentType.objects.get_for_id(self.view_content_type_id).model_class().handles_subpath(subpath)
+		view_model = self.get_view_model()
+		if view_model is not None:
+			return view_model.handles_subpath(subpath)
 		return False
 	
 	def render_to_response(self, request, extra_context=None):
-		"""This is a shortcut method for :meth:`View.render_to_response`"""
+		"""This is a shortcut method for :meth:`View.render_to_response`. If the :attr:`view` has already been fetched -- for example, by :meth:`NodeQuerySet.prefetch_views` -- it will not be fetched again."""
 		if self.view_object_id and self.view_content_type_id:
-			view_model = ContentType.objects.get_for_id(self.view_content_type_id).model_class()
-			self.view = view_model._default_manager.get(pk=self.view_object_id)
-			return self.view.render_to_response(request, extra_context)
+			view = self.view
+			if view is not None:
+				return view.render_to_response(request, extra_context)
 		raise Http404
 	
 	def get_absolute_url(self, request=None, with_domain=False, secure=False):
@@ -74,7 +153,7 @@ class Node(SlugTreeEntity):
 		
 		Node urls will not contain a trailing slash unless a subpath is provided which ends with a trailing slash. Subpaths are expected to begin with a slash, as if returned by :func:`django.core.urlresolvers.reverse`.
 		
-		Because this method will be called frequently and will always try to reverse ``philo-root``, the results of that reversal will be cached by default. This can be disabled by setting :setting:`PHILO_CACHE_PHILO_ROOT` to ``False``.
+		Because this method will be called frequently and will always try to reverse ``philo-root``, the results of that reversal will be cached by default. This can be disabled by setting :setting:`PHILO_CACHE_PHILO_ROOT` to ``False``. While the :data:`url_context` is active, the current site, the reversal, and the node's path will also be memoized for the rest of the request.
 		
 		:meth:`construct_url` may raise the following exceptions:
 		
@@ -90,17 +169,10 @@ class Node(SlugTreeEntity):
 		
 		"""
 		# Try reversing philo-root first, since we can't do anything if that fails.
-		if CACHE_PHILO_ROOT:
-			key = "CACHE_PHILO_ROOT__" + settings.ROOT_URLCONF
-			root_url = cache.get(key)
-			if root_url is None:
-				root_url = reverse('philo-root')
-				cache.set(key, root_url)
-		else:
-			root_url = reverse('philo-root')
+		root_url = url_context.get_root_url()
 		
 		try:
-			current_site = Site.objects.get_current()
+			current_site = url_context.get_current_site()
 		except Site.DoesNotExist:
 			if request is not None:
 				current_site = RequestSite(request)
@@ -112,7 +184,7 @@ class Node(SlugTreeEntity):
 				current_site = None
 		
 		root = getattr(current_site, 'root_node', None)
-		path = self.get_path(root=root)
+		path = url_context.get_path(self, root)
 		
 		if current_site and with_domain:
 			domain = "http%s://%s" % (secure and "s" or "", current_site.domain)
@@ -132,6 +204,154 @@ class Node(SlugTreeEntity):
 models.ForeignKey(Node, related_name='sites', null=True, blank=True).contribute_to_class(Site, 'root_node')
 
 
+#: A :class:`.VersionedCache` holding the route tables built by :mod:`philo.middleware`. It is invalidated whenever a :class:`Node` or :class:`Site` is saved, deleted, or moved.
+route_cache = VersionedCache('routes')
+
+
+def invalidate_routes(sender, **kwargs):
+	route_cache.invalidate()
+	url_context.clear()
+
+
+for sender in (Node, Site):
+	models.signals.post_save.connect(invalidate_routes, sender=sender)
+	models.signals.post_delete.connect(invalidate_routes, sender=sender)
+
+
+if node_moved is not None:
+	node_moved.connect(invalidate_routes, sender=Node)
+
+
+def reverse_philo_root():
+	"""Returns the result of reversing ``philo-root``, using django's cache backend unless :setting:`PHILO_CACHE_PHILO_ROOT` is ``False``."""
+	if CACHE_PHILO_ROOT:
+		key = "CACHE_PHILO_ROOT__" + settings.ROOT_URLCONF
+		root_url = cache.get(key)
+		if root_url is None:
+			root_url = reverse('philo-root')
+			cache.set(key, root_url)
+	else:
+		root_url = reverse('philo-root')
+	return root_url
+
+
+class URLContext(local):
+	"""
+	Memoizes the values which are needed to construct :class:`Node` URLs - the current :class:`Site` (along with its root node), the reversal of ``philo-root``, and the paths of :class:`Node`\ s - for as long as it is active. :class:`.RequestNodeMiddleware` activates the :data:`url_context` for the duration of each request, so that a page with many links only looks these values up once. While it is not active, nothing is memoized.
+	
+	"""
+	active = False
+	
+	def __init__(self):
+		self.clear()
+	
+	def activate(self):
+		"""Starts memoizing values with an empty memo."""
+		self.clear()
+		self.active = True
+	
+	def deactivate(self):
+		"""Stops memoizing values and empties the memo."""
+		self.active = False
+		self.clear()
+	
+	def clear(self):
+		"""Empties the memo."""
+		self._values = {}
+		self._paths = {}
+	
+	def get_root_url(self):
+		"""Returns the reversal of ``philo-root``. See :func:`reverse_philo_root`."""
+		if not self.active:
+			return reverse_philo_root()
+		try:
+			return self._values['root_url']
+		except KeyError:
+			root_url = self._values['root_url'] = reverse_philo_root()
+			return root_url
+	
+	def get_current_site(self):
+		"""Returns the result of :meth:`Site.objects.get_current`. Raises :exc:`Site.DoesNotExist` if there is no current site."""
+		if not self.active:
+			return Site.objects.get_current()
+		try:
+			current_site = self._values['current_site']
+		except KeyError:
+			try:
+				current_site = Site.objects.get_current()
+			except Site.DoesNotExist:
+				current_site = None
+			self._values['current_site'] = current_site
+		if current_site is None:
+			raise Site.DoesNotExist
+		return current_site
+	
+	def get_path(self, node, root=None):
+		"""Returns the path of ``node`` beneath ``root``, as returned by :meth:`Node.get_path`. If routes are cached (see :setting:`PHILO_CACHE_ROUTES`), the path is looked up in the cached route table instead of being built from the node's ancestors."""
+		if not self.active:
+			return node.get_path(root=root)
+		
+		root_id = getattr(root, 'pk', None)
+		key = (node.pk, root_id)
+		try:
+			return self._paths[key]
+		except KeyError:
+			pass
+		
+		from philo.middleware import CACHE_ROUTES, get_route_paths
+		path = None
+		if CACHE_ROUTES and node.pk is not None:
+			path = get_route_paths(root_id).get(node.pk)
+		if path is None:
+			path = node.get_path(root=root)
+		self._paths[key] = path
+		return path
+
+
+#: A thread-local :class:`URLContext`.
+url_context = URLContext()
+
+
+#: A :class:`.VersionedCache` whose version is the current content generation. Responses cached by :meth:`View.render_to_response` are keyed on the generation, which is bumped whenever a model in the philo app or any :class:`.Entity` subclass is saved or deleted - for example, a :class:`.Page`, :class:`.Template`, :class:`.Contentlet`, :class:`.ContentReference`, :class:`Node` or :class:`.Attribute`.
+content_cache = VersionedCache('content')
+
+
+def invalidate_content(sender, instance=None, model=None, **kwargs):
+	# m2m_changed is sent by the through model, which may belong to another
+	# app; the models on either side of the relation are checked as well.
+	if sender._meta.app_label == 'philo' or issubclass(sender, Entity) or isinstance(instance, Entity) or model is not None and issubclass(model, Entity):
+		content_cache.invalidate()
+
+
+models.signals.post_save.connect(invalidate_content)
+models.signals.post_delete.connect(invalidate_content)
+models.signals.m2m_changed.connect(invalidate_content)
+
+
+class ViewURLResolver(RegexURLResolver):
+	"""A :class:`RegexURLResolver` which memoizes the results of :meth:`reverse`, so that repeatedly reversing the same view with the same arguments - for example, when linking to many entries of a blog - only does the work once. At most :attr:`reverse_memo_size` results are kept."""
+	#: The maximum number of reversals which will be memoized.
+	reverse_memo_size = 1000
+	
+	def __init__(self, *args, **kwargs):
+		super(ViewURLResolver, self).__init__(*args, **kwargs)
+		self._reverse_memo = LRUCache(self.reverse_memo_size)
+	
+	def reverse(self, lookup_view, *args, **kwargs):
+		# Arguments are compared as unicode, which is how they are substituted into the url.
+		key = (lookup_view, tuple([force_unicode(v) for v in args]), tuple(sorted([(k, force_unicode(v)) for k, v in kwargs.items()])))
+		try:
+			result = self._reverse_memo.get(key)
+		except TypeError:
+			# lookup_view isn't hashable.
+			return super(ViewURLResolver, self).reverse(lookup_view, *args, **kwargs)
+		
+		if result is None:
+			result = super(ViewURLResolver, self).reverse(lookup_view, *args, **kwargs)
+			self._reverse_memo.set(key, result)
+		return result
+
+
 class View(Entity):
 	"""
 	:class:`View` is an abstract model that represents an item which can be "rendered", generally in response to an :class:`HttpRequest`.
@@ -143,6 +363,12 @@ class View(Entity):
 	#: An attribute on the class which defines whether this :class:`View` can handle subpaths. Default: ``False``
 	accepts_subpath = False
 	
+	#: An attribute on the class which defines the number of seconds for which anonymous responses rendered by this :class:`View` may be cached, or ``None`` if they may not be cached. Default: ``None``
+	response_cache_timeout = None
+	
+	#: An attribute on the class which defines whether responses rendered by this :class:`View` carry the validators from :meth:`get_validators`, so that conditional requests can be answered with a 304 response. This should only be enabled for :class:`View`\ s whose responses change only when philo content is saved or deleted - not, for example, with the current time. Default: ``False``
+	conditional_responses = False
+	
 	@classmethod
 	def handles_subpath(cls, subpath):
 		"""Returns True if the :class:`View` handles the given subpath, and False otherwise."""
@@ -179,7 +405,7 @@ class View(Entity):
 			kwargs = obj_kwargs
 		
 		try:
-			subpath = reverse(view_name, urlconf=self, args=args or [], kwargs=kwargs or {})
+			subpath = self.get_subpath(view_name, args, kwargs)
 		except NoReverseMatch, e:
 			raise ViewCanNotProvideSubpath(e.message)
 		
@@ -187,6 +413,62 @@ class View(Entity):
 			return node.construct_url(subpath)
 		return subpath
 	
+	def get_url_resolver(self):
+		"""
+		Returns a :class:`ViewURLResolver` for the view's ``urlpatterns``, whose callbacks belong to this instance. The resolver is kept on the instance and reused as long as the values of the view's fields are unchanged.
+		
+		"""
+		state = [getattr(self, field.attname) for field in self._meta.fields]
+		cached = self.__dict__.get('_url_resolver')
+		if cached is not None and cached[0] == state:
+			return cached[1]
+		
+		# Build the resolver from a snapshot of the urlpatterns so that they
+		# aren't rebuilt every time the resolver accesses them.
+		resolver = ViewURLResolver(r'^/', self.urlpatterns)
+		self._url_resolver = (state, resolver)
+		return resolver
+	
+	def get_reverse_resolver(self):
+		"""
+		Returns a :class:`ViewURLResolver` which can be used to reverse urls against the view's ``urlpatterns``. These resolvers are shared by all instances of a view in a process - cached by content type and pk, and reused as long as the values of the view's fields are unchanged and the content generation (see :data:`content_cache`) hasn't changed - so that their memoized reversals outlive a single request. Since their callbacks may belong to another instance of the view, they must never be used to resolve a request; use :meth:`get_url_resolver` for that.
+		
+		"""
+		if self.pk is None:
+			return self.get_url_resolver()
+		
+		key = ('resolver', ContentType.objects.get_for_model(self).pk, self.pk)
+		state = [getattr(self, field.attname) for field in self._meta.fields]
+		cached = content_cache.get(key)
+		if cached is not None and cached[0] == state:
+			return cached[1]
+		
+		resolver = self.get_url_resolver()
+		content_cache.set(key, (state, resolver))
+		return resolver
+	
+	def get_subpath(self, view_name, args=None, kwargs=None):
+		"""
+		Reverses ``view_name`` with ``args`` and ``kwargs`` against the view's :meth:`reverse resolver <get_reverse_resolver>`, as :func:`django.core.urlresolvers.reverse` would with ``self`` as the urlconf.
+		
+		:raises NoReverseMatch: if the reversal is not possible.
+		
+		"""
+		resolver = self.get_reverse_resolver()
+		prefix = get_script_prefix()
+		
+		if isinstance(view_name, basestring) and ':' in view_name:
+			namespaces = view_name.split(':')
+			view_name = namespaces.pop()
+			for namespace in namespaces:
+				try:
+					extra, resolver = resolver.namespace_dict[namespace]
+				except KeyError:
+					raise NoReverseMatch("%s is not a registered namespace" % namespace)
+				prefix += extra
+		
+		return iri_to_uri(u'%s%s' % (prefix, resolver.reverse(view_name, *(args or []), **(kwargs or {}))))
+	
 	def get_reverse_params(self, obj):
 		"""
 		This method is not implemented on the base class. It should return a (``view_name``, ``args``, ``kwargs``) tuple suitable for reversing a url for the given ``obj`` using ``self`` as the urlconf. If a reversal will not be possible, this method should raise :class:`~philo.exceptions.ViewCanNotProvideSubpath`.
@@ -201,20 +483,136 @@ class View(Entity):
 		"""
 		return mapper((self, node))
 	
+	def is_request_view(self, request):
+		"""Returns ``True`` if the :class:`View` is the :attr:`~Node.view` of the request's :class:`Node`, and ``False`` if it is being rendered on behalf of another :class:`View` - for example, a :class:`.Page` rendered by a :class:`MultiView`, whose response may depend on more than the :class:`.Page`."""
+		node = request.node
+		if node is None or self.pk is None:
+			return False
+		return node.view_object_id == self.pk and node.view_content_type_id == ContentType.objects.get_for_model(self).pk
+	
+	def get_response_cache_timeout(self, request):
+		"""
+		Returns the number of seconds for which the response to ``request`` may be cached, or ``None`` if it may not be cached. Responses are only cached for :attr:`View`\ s whose :attr:`response_cache_timeout` is not ``None``; for those, a ``response_cache_timeout`` :class:`Attribute` on the :class:`View` or on the :class:`Node` and its ancestors overrides the class attribute. The result of that lookup is kept in the :data:`content_cache`. GET and HEAD requests by authenticated users are never cached, and neither are :class:`View`\ s rendered on behalf of another :class:`View` (see :meth:`is_request_view`).
+		
+		"""
+		if self.response_cache_timeout is None or request.method not in ('GET', 'HEAD'):
+			return None
+		
+		if hasattr(request, 'user') and request.user.is_authenticated():
+			return None
+		
+		if not self.is_request_view(request):
+			return None
+		
+		# The attribute lookup is memoized for the current content generation,
+		# so that cache hits don't need to query for attributes.
+		key = ('response_cache_timeout', ContentType.objects.get_for_model(self).pk, self.pk, request.node.pk)
+		memo = content_cache.get(key)
+		if memo is None:
+			timeout = self.attributes_with_node(request.node).get('response_cache_timeout', self.response_cache_timeout)
+			memo = (timeout or None,)
+			if self.pk is not None:
+				content_cache.set(key, memo)
+		return memo[0]
+	
+	def get_response_cache_prefix(self, request):
+		"""Returns a prefix for the keys of responses to ``request`` which includes the current content generation, the :class:`Node`, and the host, path, and query string of the request."""
+		location = md5_constructor(smart_str(request.get_host() + request.get_full_path())).hexdigest()
+		return "philo.response.%s.%s.%s" % (content_cache.get_version(), request.node.pk, location)
+	
+	def get_response_cache_vary_headers(self, request, response):
+		"""
+		Returns the headers which a cached ``response`` to ``request`` varies on in addition to its own ``Vary`` header. The response is cached before it passes through :func:`~philo.views.node_view` and the response middleware, which may add to its ``Vary`` header later; the key must account for those headers up front. By default, these are ``Accept`` (added by :func:`~philo.views.node_view`), ``Accept-Encoding`` and ``Accept-Language`` if :class:`~django.middleware.gzip.GZipMiddleware` or :class:`~django.middleware.locale.LocaleMiddleware` is installed, and ``Cookie`` if the request's session was accessed.
+		
+		"""
+		headers = ['Accept']
+		if 'django.middleware.gzip.GZipMiddleware' in settings.MIDDLEWARE_CLASSES:
+			headers.append('Accept-Encoding')
+		if 'django.middleware.locale.LocaleMiddleware' in settings.MIDDLEWARE_CLASSES:
+			headers.append('Accept-Language')
+		if getattr(getattr(request, 'session', None), 'accessed', False):
+			headers.append('Cookie')
+		return headers
+	
+	def get_validators(self, request):
+		"""
+		Returns an ``(etag, last_modified)`` tuple for the response to ``request``, where ``last_modified`` is a unix timestamp, or ``(None, None)`` if the response should not be validated.
+		
+		By default, validators are only provided if :attr:`conditional_responses` is ``True``, and only for GET and HEAD requests by anonymous users which are rendered by the request's :class:`Node`'s own :attr:`~Node.view` (see :meth:`is_request_view`). Both are derived from the current content generation, which changes whenever philo content is saved or deleted (see :data:`content_cache`). The ``etag`` also covers the request's ``Accept`` header, since the response may be negotiated from it.
+		
+		"""
+		if not self.conditional_responses or request.method not in ('GET', 'HEAD'):
+			return None, None
+		
+		if hasattr(request, 'user') and request.user.is_authenticated():
+			return None, None
+		
+		if not self.is_request_view(request):
+			return None, None
+		
+		etag = md5_constructor(smart_str("%s:%s:%s%s:%s" % (content_cache.get_version(), request.node.pk, request.get_host(), request.get_full_path(), request.META.get('HTTP_ACCEPT', '')))).hexdigest()
+		return etag, content_cache.get_modified()
+	
 	def render_to_response(self, request, extra_context=None):
 		"""
 		Renders the :class:`View` as an :class:`HttpResponse`. This will raise :const:`~philo.exceptions.MIDDLEWARE_NOT_CONFIGURED` if the `request` doesn't have an attached :class:`Node`. This can happen if the :class:`~philo.middleware.RequestNodeMiddleware` is not in :setting:`settings.MIDDLEWARE_CLASSES` or if it is not functioning correctly.
 		
 		:meth:`render_to_response` will send the :data:`~philo.signals.view_about_to_render` signal, then call :meth:`actually_render_to_response`, and finally send the :data:`~philo.signals.view_finished_rendering` signal before returning the ``response``.
+		
+		If :meth:`get_response_cache_timeout` returns a timeout, a cached response will be returned instead if one is available, and no signals will be sent. Only responses to GET requests are cached, and HEAD requests are answered with them. Cached responses are keyed on the request's :class:`Node`, path, and ``Vary`` headers - including those from :meth:`get_response_cache_vary_headers` - and on the current content generation.
+		
+		The ``ETag`` and ``Last-Modified`` headers of successful responses will be set from the results of :meth:`get_validators`; ``Last-Modified`` is left out while it is the current second. If the request's ``If-None-Match`` or ``If-Modified-Since`` header shows that the client already has the current response, an :class:`HttpResponseNotModified` will be returned without rendering the :class:`View`.
 
 		"""
 		if not hasattr(request, 'node'):
 			raise MIDDLEWARE_NOT_CONFIGURED
 		
+		etag, last_modified = self.get_validators(request)
+		if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+		if if_none_match is not None:
+			# If-None-Match takes precedence over If-Modified-Since.
+			if etag is not None:
+				etags = parse_etags(if_none_match)
+				if etag in etags or '*' in etags:
+					return HttpResponseNotModified()
+		elif last_modified is not None:
+			if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+			if if_modified_since is not None and last_modified <= if_modified_since:
+				return HttpResponseNotModified()
+		
+		timeout = self.get_response_cache_timeout(request)
+		if timeout is not None:
+			key_prefix = self.get_response_cache_prefix(request)
+			# HEAD requests are answered with the cached response to a GET request.
+			if request.method == 'HEAD':
+				get_request = copy(request)
+				get_request.method = 'GET'
+			else:
+				get_request = request
+			cache_key = get_cache_key(get_request, key_prefix, 'GET', cache=cache)
+			if cache_key is not None:
+				response = cache.get(cache_key)
+				if response is not None:
+					return response
+		
 		extra_context = extra_context or {}
 		view_about_to_render.send(sender=self, request=request, extra_context=extra_context)
 		response = self.actually_render_to_response(request, extra_context)
 		view_finished_rendering.send(sender=self, response=response)
+		
+		if response.status_code in (200, 206):
+			if etag is not None and not response.has_header('ETag'):
+				response['ETag'] = quote_etag(etag)
+			# A Last-Modified from the current second could be followed by another
+			# change within the same second, which If-Modified-Since couldn't tell apart.
+			if last_modified is not None and last_modified < int(time()) and not response.has_header('Last-Modified'):
+				response['Last-Modified'] = http_date(last_modified)
+		
+		# Don't cache responses to HEAD requests, which may be sent without a body, or responses which set cookies, which include a CSRF token, which modify the session, or which are streamed.
+		if timeout is not None and request.method == 'GET' and response.status_code == 200 and not response.cookies and not request.META.get('CSRF_COOKIE_USED') and not getattr(getattr(request, 'session', None), 'modified', False) and getattr(response, '_is_string', False):
+			patch_vary_headers(response, self.get_response_cache_vary_headers(request, response))
+			cache_key = learn_cache_key(request, response, timeout, key_prefix, cache=cache)
+			cache.set(cache_key, response, timeout)
 		return response
 	
 	def actually_render_to_response(self, request, extra_context=None):
@@ -243,12 +641,11 @@ class MultiView(View):
 	
 	def actually_render_to_response(self, request, extra_context=None):
 		"""
-		Resolves the remaining subpath left after finding this :class:`View`'s node using :attr:`self.urlpatterns <urlpatterns>` and renders the view function (or method) found with the appropriate args and kwargs.
+		Resolves the remaining subpath left after finding this :class:`View`'s node using the view's :meth:`~View.get_url_resolver` and renders the view function (or method) found with the appropriate args and kwargs.
 		
 		"""
-		clear_url_caches()
 		subpath = request.node._subpath
-		view, args, kwargs = resolve(subpath, urlconf=self)
+		view, args, kwargs = self.get_url_resolver().resolve(subpath)
 		view_args = getargspec(view)
 		if extra_context is not None and ('extra_context' in view_args[0] or view_args[2] is not None):
 			if 'extra_context' in kwargs:
@@ -396,6 +793,9 @@ class Redirect(TargetURLModel, View):
 
 class File(View):
 	"""Stores an arbitrary file."""
+	#: Same as :attr:`View.conditional_responses`. Default: ``True``
+	conditional_responses = True
+	
 	#: The name of the uploaded file. This is meant for finding the file again later, not for display.
 	name = models.CharField(max_length=255)
 	#: Defines the mimetype of the uploaded file. This will not be validated. If no mimetype is provided, it will be automatically generated based on the filename.
@@ -409,11 +809,101 @@ class File(View):
 			if self.mimetype is None:
 				raise ValidationError("Unknown file type.")
 	
+	def get_validators(self, request):
+		"""Returns an ``(etag, last_modified)`` tuple derived from the name, size, and modification time of the stored file. Unlike :meth:`View.get_validators`, these are provided for GET and HEAD requests by any user, since the file is the same for everyone."""
+		if request.method not in ('GET', 'HEAD'):
+			return None, None
+		
+		try:
+			size = self.file.size
+		except EnvironmentError:
+			return None, None
+		
+		try:
+			last_modified = int(mktime(self.file.storage.modified_time(self.file.name).timetuple()))
+		except (EnvironmentError, NotImplementedError, AttributeError):
+			last_modified = None
+		
+		etag = md5_constructor(smart_str("%s:%s:%s" % (self.file.name, size, last_modified))).hexdigest()
+		return etag, last_modified
+	
+	def if_range_matches(self, request):
+		"""Returns ``False`` if the request has an ``If-Range`` header which doesn't match the file's current validators - meaning that any ``Range`` header should be ignored and the whole file sent - and ``True`` otherwise."""
+		if_range = request.META.get('HTTP_IF_RANGE')
+		if if_range is None:
+			return True
+		
+		etag, last_modified = self.get_validators(request)
+		if_range = if_range.strip()
+		if if_range.startswith('"') or if_range.startswith('W/'):
+			return etag is not None and quote_etag(etag) == if_range
+		return last_modified is not None and parse_http_date_safe(if_range) == last_modified
+	
 	def actually_render_to_response(self, request, extra_context=None):
-		wrapper = FileWrapper(self.file)
-		response = HttpResponse(wrapper, content_type=self.mimetype)
-		response['Content-Length'] = self.file.size
-		response['Content-Disposition'] = "inline; filename=%s" % basename(self.file.name)
+		"""
+		Returns the file as an :class:`HttpResponse`. If :data:`FILE_OFFLOAD` is set, the response will only contain a header telling the front-end server which file to send. Otherwise - or if the file's storage can't provide the local path needed for ``X-Sendfile`` - the file is streamed, honoring any single or multiple byte ranges (up to :data:`FILE_MAX_RANGES`) in the request's ``Range`` header.
+		
+		"""
+		disposition = "inline; filename=%s" % basename(self.file.name)
+		
+		offload = None
+		if FILE_OFFLOAD == 'x-accel-redirect':
+			offload = ('X-Accel-Redirect', iri_to_uri(FILE_ACCEL_REDIRECT_PREFIX + self.file.name))
+		elif FILE_OFFLOAD is not None:
+			try:
+				offload = ('X-Sendfile', smart_str(self.file.path))
+			except (NotImplementedError, AttributeError):
+				# The storage has no local paths.
+				pass
+		
+		if offload is not None:
+			response = HttpResponse(content_type=self.mimetype)
+			response[offload[0]] = offload[1]
+			response['Content-Disposition'] = disposition
+			return response
+		
+		size = self.file.size
+		ranges = None
+		range_header = request.META.get('HTTP_RANGE')
+		if range_header and request.method in ('GET', 'HEAD') and self.if_range_matches(request):
+			ranges = parse_range_header(range_header, size, FILE_MAX_RANGES)
+		
+		if ranges is None:
+			response = HttpResponse(FileWrapper(self.file), content_type=self.mimetype)
+			response['Content-Length'] = size
+		elif not ranges:
+			response = HttpResponse(status=416)
+			response['Content-Range'] = "bytes */%d" % size
+			return response
+		elif len(ranges) == 1:
+			first, last = ranges[0]
+			response = HttpResponse(iter_file_range(self.file, first, last), content_type=self.mimetype, status=206)
+			response['Content-Length'] = last - first + 1
+			response['Content-Range'] = "bytes %d-%d/%d" % (first, last, size)
+		else:
+			boundary = choose_boundary()
+			parts = []
+			length = 0
+			for first, last in ranges:
+				part_header = "--%s\r\nContent-Type: %s\r\nContent-Range: bytes %d-%d/%d\r\n\r\n" % (boundary, self.mimetype or 'application/octet-stream', first, last, size)
+				parts.append((part_header, first, last))
+				length += len(part_header) + last - first + 1 + 2
+			closing = "--%s--\r\n" % boundary
+			length += len(closing)
+			
+			def multipart():
+				for part_header, first, last in parts:
+					yield part_header
+					for data in iter_file_range(self.file, first, last):
+						yield data
+					yield "\r\n"
+				yield closing
+			
+			response = HttpResponse(multipart(), content_type="multipart/byteranges; boundary=%s" % boundary, status=206)
+			response['Content-Length'] = length
+		
+		response['Accept-Ranges'] = 'bytes'
+		response['Content-Disposition'] = disposition
 		return response
 	
 	class Meta:
@@ -4,19 +4,27 @@
 
 """
 
+import operator
+import re
+from hashlib import sha1
+
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes import generic
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.http import HttpResponse
-from django.template import Context, RequestContext, Template as DjangoTemplate
+from django.template import Context, RequestContext, Template as DjangoTemplate, TemplateDoesNotExist, TemplateSyntaxError
+from django.utils import simplejson as json
+from django.utils.datastructures import SortedDict
+from django.utils.encoding import smart_str, smart_unicode
 
 from philo.models.base import SlugTreeEntity, register_value_model
-from philo.models.fields import TemplateField
-from philo.models.nodes import View
+from philo.models.fields import JSONField, TemplateField
+from philo.models.nodes import View, node_moved
 from philo.signals import page_about_to_render_to_string, page_finished_rendering_to_string
 from philo.utils import templates
+from philo.utils.cache import VersionedCache
 
 
 __all__ = ('Template', 'Page', 'Contentlet', 'ContentReference')
@@ -32,16 +40,94 @@ class Template(SlugTreeEntity):
 	mimetype = models.CharField(max_length=255, default=getattr(settings, 'DEFAULT_CONTENT_TYPE', 'text/html'))
 	#: An insecure :class:`~philo.models.fields.TemplateField` containing the django template code for this template.
 	code = TemplateField(secure=False, verbose_name='django template code')
+	#: A :class:`~philo.models.fields.JSONField` storing the specs of the :ttag:`container`\ s in this template so that :meth:`get_containers` doesn't need to compile it. This is computed when the template's code changes and when a template which it extends or includes is saved or moved.
+	container_specs = JSONField(default='null', blank=True, editable=False)
+	
+	def get_compiled(self):
+		"""
+		Returns a compiled django template for :attr:`code`. Compiled templates are cached per process by primary key and a hash of :attr:`code`, so unsaved changes are never served from the cache. The cache is emptied whenever any :class:`Template` is saved or deleted.
+		
+		"""
+		key = (self.pk, sha1(smart_str(self.code)).hexdigest())
+		template = compiled_templates.get(key)
+		if template is None:
+			template = DjangoTemplate(self.code, name=smart_unicode(self))
+			compiled_templates.set(key, template)
+		return template
 	
 	def get_containers(self):
 		"""
 		Returns a tuple where the first item is a list of names of contentlets referenced by containers, and the second item is a list of tuples of names and contenttypes of contentreferences referenced by containers. This will break if there is a recursive extends or includes in the template code. Due to the use of an empty Context, any extends or include tags with dynamic arguments probably won't work.
 		
+		The result is read from :attr:`container_specs` if possible. Otherwise, it is computed and - for saved templates - stored.
+		
 		"""
-		template = DjangoTemplate(self.code)
-		return templates.get_containers(template)
+		if self.container_specs is None:
+			self.container_specs = self.compute_container_specs()
+			if self.pk is not None:
+				Template.objects.filter(pk=self.pk).update(container_specs=json.dumps(self.container_specs))
+		contentlet_specs, contentreference_specs = self.container_specs
+		return contentlet_specs, SortedDict([(name, ContentType.objects.get_by_natural_key(*natural_key)) for name, natural_key in contentreference_specs])
 	containers = property(get_containers)
 	
+	def compute_container_specs(self):
+		"""Compiles the template and returns the specs of its :ttag:`container`\ s in the form stored in :attr:`container_specs`."""
+		contentlet_specs, contentreference_specs = templates.get_containers(self.get_compiled())
+		return [contentlet_specs, [(name, content_type.natural_key()) for name, content_type in contentreference_specs.items()]]
+	
+	def save(self, *args, **kwargs):
+		old = None
+		if self.pk is not None:
+			try:
+				old = Template.objects.get(pk=self.pk)
+			except Template.DoesNotExist:
+				pass
+		
+		code_changed = old is None or old.code != self.code
+		if code_changed or self.container_specs is None:
+			try:
+				self.container_specs = self.compute_container_specs()
+			except (TemplateSyntaxError, TemplateDoesNotExist):
+				# Leave the specs to be computed - and the error raised - by get_containers.
+				self.container_specs = None
+		
+		old_path = None
+		if old is not None and (old.slug != self.slug or old.parent_id != self.parent_id):
+			old_path = old.get_path(memoize=False)
+		
+		super(Template, self).save(*args, **kwargs)
+		
+		if code_changed or old_path is not None:
+			self.update_dependent_container_specs(old_path)
+	
+	def move_to(self, target, position='first-child'):
+		old_path = self.get_path(memoize=False)
+		super(Template, self).move_to(target, position)
+		self.update_dependent_container_specs(old_path)
+	
+	def update_dependent_container_specs(self, old_path=None):
+		"""Recomputes the :attr:`container_specs` of every saved template which may extend or include this one, directly or indirectly - that is, every template whose code contains this one's path as a quoted string. If the template's path has changed, ``old_path`` should be given so that templates which still refer to the old path - and so no longer resolve it - are recomputed as well."""
+		seen = set([self.pk])
+		queue = [(self, old_path)]
+		while queue:
+			template, old_path = queue.pop(0)
+			paths = [template.get_path(memoize=False)]
+			if old_path:
+				paths.append(old_path)
+			query = reduce(operator.or_, [models.Q(code__contains=path) for path in paths])
+			# The query also finds templates which merely contain the paths, for
+			# example as part of longer paths; only quoted paths are references.
+			reference = re.compile(r"""(['"])(%s)\1""" % '|'.join([re.escape(path) for path in paths]))
+			dependents = [dependent for dependent in Template.objects.filter(query).exclude(pk__in=seen) if reference.search(dependent.code)]
+			for dependent in dependents:
+				try:
+					container_specs = dependent.compute_container_specs()
+				except (TemplateSyntaxError, TemplateDoesNotExist):
+					container_specs = None
+				Template.objects.filter(pk=dependent.pk).update(container_specs=json.dumps(container_specs))
+				seen.add(dependent.pk)
+				queue.append((dependent, None))
+	
 	def __unicode__(self):
 		"""Returns the value of the :attr:`name` field."""
 		return self.name
@@ -50,6 +136,25 @@ class Template(SlugTreeEntity):
 		app_label = 'philo'
 
 
+#: A :class:`.VersionedCache` holding the compiled django templates returned by :meth:`Template.get_compiled`. It is invalidated whenever a :class:`Template` is saved, deleted, or moved, since templates which extend or include the changed :class:`Template` may depend on it.
+compiled_templates = VersionedCache('templates')
+#: A :class:`.VersionedCache` mapping template paths to :class:`Template` instances (or ``None`` for paths which do not exist) for :class:`philo.loaders.database.CachedLoader`. It is invalidated along with :data:`compiled_templates`; saving or moving a :class:`Template` also changes the paths of its descendants.
+template_paths = VersionedCache('template_paths')
+
+
+def invalidate_templates(sender, **kwargs):
+	compiled_templates.invalidate()
+	template_paths.invalidate()
+
+
+models.signals.post_save.connect(invalidate_templates, sender=Template)
+models.signals.post_delete.connect(invalidate_templates, sender=Template)
+
+
+if node_moved is not None:
+	node_moved.connect(invalidate_templates, sender=Template)
+
+
 class Page(View):
 	"""
 	Represents a page - something which is rendered according to a :class:`Template`. The page will have a number of related :class:`Contentlet`\ s and :class:`ContentReference`\ s depending on the template selected - but these will appear only after the page has been saved with that template.
@@ -60,6 +165,11 @@ class Page(View):
 	#: The name of this page. Chances are this will be used for organization - i.e. finding the page in a list of pages - rather than for display.
 	title = models.CharField(max_length=255)
 	
+	#: Same as :attr:`.View.response_cache_timeout`. Default: the value of :setting:`PHILO_PAGE_CACHE_TIMEOUT` if it is set; otherwise, ``None``.
+	response_cache_timeout = getattr(settings, 'PHILO_PAGE_CACHE_TIMEOUT', None)
+	#: Same as :attr:`.View.conditional_responses`. Default: the value of :setting:`PHILO_PAGE_CONDITIONAL_RESPONSES` if it is set; otherwise, ``False``.
+	conditional_responses = getattr(settings, 'PHILO_PAGE_CONDITIONAL_RESPONSES', False)
+	
 	def get_containers(self):
 		"""
 		Returns the results :attr:`~Template.containers` for the related template. This is a tuple containing the specs of all :ttag:`container`\ s in the :class:`Template`'s code. The value will be cached on the instance so that multiple accesses will be less expensive.
@@ -80,7 +190,7 @@ class Page(View):
 		context = {}
 		context.update(extra_context or {})
 		context.update({'page': self, 'attributes': self.attributes})
-		template = DjangoTemplate(self.template.code)
+		template = self.template.get_compiled()
 		if request:
 			context.update({'node': request.node, 'attributes': self.attributes_with_node(request.node)})
 			page_about_to_render_to_string.send(sender=self, request=request, extra_context=context)
@@ -21,15 +21,36 @@ class ContainerContext(object):
 	def __init__(self, page):
 		self.page = page
 	
+	def load(self):
+		"""Fetches the page's contentlets and content references along with the content of the references, using one query per referenced content type."""
+		if hasattr(self, '_contentlets'):
+			return
+		self._contentlets = dict(((c.name, c) for c in self.page.contentlets.all()))
+		references = list(self.page.contentreferences.all())
+		
+		lookups = {}
+		for reference in references:
+			if reference.content_id is not None:
+				lookups.setdefault(reference.content_type_id, set()).add(reference.content_id)
+		
+		contents = {}
+		for ct_id, pks in lookups.items():
+			model = ContentType.objects.get_for_id(ct_id).model_class()
+			contents[ct_id] = model._default_manager.in_bulk(list(pks))
+		
+		self._references = {}
+		for reference in references:
+			if reference.content_id is not None:
+				# Cache the content - or its absence - on the reference's generic foreign key.
+				setattr(reference, type(reference).content.cache_attr, contents[reference.content_type_id].get(reference.content_id))
+			self._references[(reference.name, ContentType.objects.get_for_id(reference.content_type_id))] = reference
+	
 	def get_contentlets(self):
-		if not hasattr(self, '_contentlets'):
-			self._contentlets = dict(((c.name, c) for c in self.page.contentlets.all()))
+		self.load()
 		return self._contentlets
 	
 	def get_references(self):
-		if not hasattr(self, '_references'):
-			references = self.page.contentreferences.all()
-			self._references = dict((((c.name, ContentType.objects.get_for_id(c.content_type_id)), c) for c in references))
+		self.load()
 		return self._references
 
 
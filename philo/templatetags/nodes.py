@@ -6,7 +6,7 @@ The node template tags are automatically included as builtins if :mod:`philo` is
 from django import template
 from django.conf import settings
 from django.contrib.sites.models import Site
-from django.core.urlresolvers import reverse, NoReverseMatch
+from django.core.urlresolvers import NoReverseMatch
 from django.template.defaulttags import kwarg_re
 from django.utils.encoding import smart_str
 
@@ -54,7 +54,7 @@ class NodeURLNode(template.Node):
 			
 			url = ''
 			try:
-				subpath = reverse(view_name, urlconf=node.view, args=args, kwargs=kwargs)
+				subpath = node.view.get_subpath(view_name, args, kwargs)
 			except NoReverseMatch:
 				if self.as_var is None:
 					if settings.TEMPLATE_DEBUG:
@@ -4,15 +4,18 @@ import traceback
 from django import template
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.urlresolvers import NoReverseMatch
 from django.db import connection, models
 from django.template import loader
 from django.template.loaders import cached
 from django.test import TestCase
 from django.test.utils import setup_test_template_loader, restore_template_loaders
+from django.utils import simplejson as json, unittest
 from django.utils.datastructures import SortedDict
+from taggit.models import Tag
 
 from philo.exceptions import AncestorDoesNotExist
-from philo.models import Node, Page, Template, Tag
+from philo.models import Node, Page, Template
 
 
 class TemplateTestCase(TestCase):
@@ -74,33 +77,33 @@ class TemplateTestCase(TestCase):
 			'embed03': ('{{ embedded.name|safe }} is a lie!', {'embedded': embedded}, '%s is a lie!' % embedded.name),
 			
 			# Simple template structure with embed
-			'simple01': ('{% embed philo.tag with "embed01" %}{% embed philo.tag 1 %}Simple{% block one %}{% endblock %}', {'embedded': embedded}, '%sSimple' % embedded.name),
+			'simple01': ('{% embed taggit.tag with "embed01" %}{% embed taggit.tag 1 %}Simple{% block one %}{% endblock %}', {'embedded': embedded}, '%sSimple' % embedded.name),
 			'simple02': ('{% extends "simple01" %}', {}, '%sSimple' % embedded.name),
-			'simple03': ('{% embed philo.tag with "embed000" %}', {}, settings.TEMPLATE_STRING_IF_INVALID),
-			'simple04': ('{% embed philo.tag 1 %}', {}, settings.TEMPLATE_STRING_IF_INVALID),
-			'simple05': ('{% embed philo.tag with "embed01" %}{% embed embedded %}', {'embedded': embedded}, embedded.name),
+			'simple03': ('{% embed taggit.tag with "embed000" %}', {}, settings.TEMPLATE_STRING_IF_INVALID),
+			'simple04': ('{% embed taggit.tag 1 %}', {}, settings.TEMPLATE_STRING_IF_INVALID),
+			'simple05': ('{% embed taggit.tag with "embed01" %}{% embed embedded %}', {'embedded': embedded}, embedded.name),
 			
 			# Kwargs
-			'kwargs01': ('{% embed philo.tag with "embed02" %}{% embed philo.tag 1 var1="hi" var2=lo %}', {'lo': 'lo'}, '%shilo' % embedded.name),
+			'kwargs01': ('{% embed taggit.tag with "embed02" %}{% embed taggit.tag 1 var1="hi" var2=lo %}', {'lo': 'lo'}, '%shilo' % embedded.name),
 			
 			# Filters/variables
-			'filters01': ('{% embed philo.tag with "embed02" %}{% embed philo.tag 1 var1=hi|first var2=lo|slice:"3" %}', {'hi': ["These", "words"], 'lo': 'lower'}, '%sTheselow' % embedded.name),
-			'filters02': ('{% embed philo.tag with "embed01" %}{% embed philo.tag entry %}', {'entry': 1}, embedded.name),
+			'filters01': ('{% embed taggit.tag with "embed02" %}{% embed taggit.tag 1 var1=hi|first var2=lo|slice:"3" %}', {'hi': ["These", "words"], 'lo': 'lower'}, '%sTheselow' % embedded.name),
+			'filters02': ('{% embed taggit.tag with "embed01" %}{% embed taggit.tag entry %}', {'entry': 1}, embedded.name),
 			
 			# Blocky structure
 			'block01': ('{% block one %}Hello{% endblock %}', {}, 'Hello'),
-			'block02': ('{% extends "simple01" %}{% block one %}{% embed philo.tag 1 %}{% endblock %}', {}, "%sSimple%s" % (embedded.name, embedded.name)),
-			'block03': ('{% extends "simple01" %}{% embed philo.tag with "embed03" %}{% block one %}{% embed philo.tag 1 %}{% endblock %}', {}, "%sSimple%s is a lie!" % (embedded.name, embedded.name)),
+			'block02': ('{% extends "simple01" %}{% block one %}{% embed taggit.tag 1 %}{% endblock %}', {}, "%sSimple%s" % (embedded.name, embedded.name)),
+			'block03': ('{% extends "simple01" %}{% embed taggit.tag with "embed03" %}{% block one %}{% embed taggit.tag 1 %}{% endblock %}', {}, "%sSimple%s is a lie!" % (embedded.name, embedded.name)),
 			
 			# Blocks and includes
-			'block-include01': ('{% extends "simple01" %}{% embed philo.tag with "embed03" %}{% block one %}{% include "simple01" %}{% embed philo.tag 1 %}{% endblock %}', {}, "%sSimple%sSimple%s is a lie!" % (embedded.name, embedded.name, embedded.name)),
-			'block-include02': ('{% extends "simple01" %}{% block one %}{% include "simple04" %}{% embed philo.tag with "embed03" %}{% include "simple04" %}{% embed philo.tag 1 %}{% endblock %}', {}, "%sSimple%s%s is a lie!%s is a lie!" % (embedded.name, embedded.name, embedded.name, embedded.name)),
+			'block-include01': ('{% extends "simple01" %}{% embed taggit.tag with "embed03" %}{% block one %}{% include "simple01" %}{% embed taggit.tag 1 %}{% endblock %}', {}, "%sSimple%sSimple%s is a lie!" % (embedded.name, embedded.name, embedded.name)),
+			'block-include02': ('{% extends "simple01" %}{% block one %}{% include "simple04" %}{% embed taggit.tag with "embed03" %}{% include "simple04" %}{% embed taggit.tag 1 %}{% endblock %}', {}, "%sSimple%s%s is a lie!%s is a lie!" % (embedded.name, embedded.name, embedded.name, embedded.name)),
 			
 			# Tests for more complex situations...
 			'complex01': ('{% block one %}{% endblock %}complex{% block two %}{% endblock %}', {}, 'complex'),
 			'complex02': ('{% extends "complex01" %}', {}, 'complex'),
-			'complex03': ('{% extends "complex02" %}{% embed philo.tag with "embed01" %}', {}, 'complex'),
-			'complex04': ('{% extends "complex03" %}{% block one %}{% embed philo.tag 1 %}{% endblock %}', {}, '%scomplex' % embedded.name),
+			'complex03': ('{% extends "complex02" %}{% embed taggit.tag with "embed01" %}', {}, 'complex'),
+			'complex04': ('{% extends "complex03" %}{% block one %}{% embed taggit.tag 1 %}{% endblock %}', {}, '%scomplex' % embedded.name),
 			'complex05': ('{% extends "complex03" %}{% block one %}{% include "simple04" %}{% endblock %}', {}, '%scomplex' % embedded.name),
 		}
 
@@ -188,6 +191,43 @@ class TreePathTestCase(TestCase):
 		# Speed increase for leaf nodes - should this be tested?
 		self.assertQueryLimit(1, (fifth, 'sub/path/tail/len/five'), 'root/second/third/fourth/fifth/sub/path/tail/len/five', absolute_result=False)
 	
+	def test_get_with_path_hashes(self):
+		# Fixtures are loaded without calling save(), so the hashes need to be built.
+		Node.objects.rebuild_path_hashes()
+		
+		root = Node.objects.get(slug='root')
+		third = Node.objects.get(slug='third')
+		second2 = Node.objects.get(slug='second2')
+		fifth = Node.objects.get(slug='fifth')
+		e = Node.DoesNotExist
+		
+		self.assertQueryLimit(0, (root, None), '', root=root, absolute_result=False, use_path_hashes=True)
+		self.assertQueryLimit(1, third, 'root/second/third', use_path_hashes=True)
+		self.assertQueryLimit(1, third, 'second/third', root=root, use_path_hashes=True)
+		self.assertQueryLimit(1, e, 'root/secont/third', use_path_hashes=True)
+		
+		self.assertQueryLimit(1, (second2, 'sub/path/tail'), 'root/second2/sub/path/tail/', absolute_result=False, use_path_hashes=True)
+		self.assertQueryLimit(1, e, 'invalid/path/1/2/3/4/5/6/7/8/9/1/2/3/4/5/6/7/8/9/0', absolute_result=False, use_path_hashes=True)
+		self.assertQueryLimit(1, (third, None), 'root/second/third', absolute_result=False, use_path_hashes=True)
+		self.assertQueryLimit(1, (second2, None), 'second2', root=root, absolute_result=False, use_path_hashes=True)
+		self.assertQueryLimit(1, (fifth, 'sub/path/tail/len/five'), 'root/second/third/fourth/fifth/sub/path/tail/len/five', absolute_result=False, use_path_hashes=True)
+		
+		# Renaming a node updates the hashes of its descendants.
+		second = Node.objects.get(slug='second')
+		second.slug = 'renamed'
+		second.save()
+		self.assertEqual(Node.objects.get_with_path('root/renamed/third', use_path_hashes=True), third)
+		self.assertRaises(e, Node.objects.get_with_path, 'root/second/third', use_path_hashes=True)
+	
+	def test_path_hashes_without_rebuild(self):
+		# Renaming a node whose hash was never built still updates its descendants.
+		Node.objects.update(path_hash='')
+		third = Node.objects.get(slug='third')
+		second = Node.objects.get(slug='second')
+		second.slug = 'renamed'
+		second.save()
+		self.assertEqual(Node.objects.get_with_path('root/renamed/third', use_path_hashes=True), third)
+	
 	def test_get_path(self):
 		root = Node.objects.get(slug='root')
 		root2 = Node.objects.get(slug='root')
@@ -202,6 +242,17 @@ class TreePathTestCase(TestCase):
 		self.assertQueryLimit(1, 'second/third', root, callable=third.get_path)
 		self.assertQueryLimit(1, e, third, callable=second2.get_path)
 		self.assertQueryLimit(1, '? - ?', root, ' - ', 'title', callable=third.get_path)
+	
+	def test_annotate_paths(self):
+		root = Node.objects.get(slug='root')
+		nodes = Node.objects.filter(slug__in=['third', 'fifth', 'second2'])
+		
+		self.assertNumQueries(2, Node.objects.annotate_paths, nodes)
+		
+		nodes = dict([(node.slug, node) for node in nodes])
+		self.assertNumQueries(1, Node.objects.annotate_paths, nodes.values(), root=root)
+		self.assertQueryLimit(0, 'second/third/fourth/fifth', root, callable=nodes['fifth'].get_path)
+		self.assertQueryLimit(0, 'second/third', root, callable=nodes['third'].get_path)
 
 
 class ContainerTestCase(TestCase):
@@ -212,7 +263,674 @@ class ContainerTestCase(TestCase):
 		self.assertEqual(contentlet_specs, ['one', 'two', 'three'])
 		
 		ct = ContentType.objects.get_for_model(Tag)
-		t = Template(code="{% container one references philo.tag as tag1 %}{% container two references philo.tag as tag2 %}{% container one references philo.tag as tag1 %}")
+		t = Template(code="{% container one references taggit.tag as tag1 %}{% container two references taggit.tag as tag2 %}{% container one references taggit.tag as tag1 %}")
 		contentlet_specs, contentreference_specs = t.containers
 		self.assertEqual(len(contentlet_specs), 0)
 		self.assertEqual(contentreference_specs, SortedDict([('one', ct), ('two', ct)]))
+	
+	def test_stored_containers(self):
+		from philo.loaders.database import Loader
+		old_loaders, loader.template_source_loaders = loader.template_source_loaders, (Loader(),)
+		try:
+			parent = Template.objects.create(name='Parent', slug='parent', code="{% container one %}{% block b %}{% endblock %}")
+			child = Template.objects.create(name='Child', slug='child', code='{% extends "parent" %}{% block b %}{% container two %}{% endblock %}')
+			self.assertEqual(Template.objects.get(pk=child.pk).container_specs, [['one', 'two'], []])
+			
+			# Saving a template updates the specs of templates which extend it.
+			parent.code = "{% container zero %}{% block b %}{% endblock %}"
+			parent.save()
+			child = Template.objects.get(pk=child.pk)
+			self.assertEqual(child.container_specs, [['zero', 'two'], []])
+			
+			# Templates which refer to a renamed template's old path are recomputed too.
+			parent.slug = 'renamed'
+			parent.save()
+			self.assertEqual(Template.objects.get(pk=child.pk).container_specs, None)
+			parent.slug = 'parent'
+			parent.save()
+			child = Template.objects.get(pk=child.pk)
+			self.assertEqual(child.container_specs, [['zero', 'two'], []])
+			
+			# Templates which only contain the path as part of a longer one aren't recomputed.
+			other = Template.objects.create(name='Other', slug='other', code='{% container four %}{# "parent.bak" #}')
+			Template.objects.filter(pk=other.pk).update(container_specs=json.dumps([['stored'], []]))
+			parent.code += ' '
+			parent.save()
+			self.assertEqual(Template.objects.get(pk=child.pk).container_specs, [['zero', 'two'], []])
+			self.assertEqual(Template.objects.get(pk=other.pk).container_specs, [['stored'], []])
+		finally:
+			loader.template_source_loaders = old_loaders
+		
+		# Stored specs are used without compiling the template.
+		child.code = "{% container three %}"
+		self.assertEqual(child.containers[0], ['zero', 'two'])
+
+	
+	def test_bulk_container_content(self):
+		from philo.models import Contentlet, ContentReference
+		from philo.templatetags.containers import ContainerContext
+		ct = ContentType.objects.get_for_model(Template)
+		t = Template.objects.create(name='Refs', slug='refs', code="{% container text %}{% container one references philo.template %}{% container two references philo.template %}")
+		page = Page.objects.create(template=t, title='Refs')
+		Contentlet.objects.create(page=page, name='text', content='Text')
+		for name in ('one', 'two'):
+			ContentReference.objects.create(page=page, name=name, content_type=ct, content_id=Template.objects.create(name=name, slug=name, code='').pk)
+		
+		# Contentlets, references, and referenced templates each cost one query, however many containers there are.
+		container_context = ContainerContext(page)
+		self.assertNumQueries(3, container_context.load)
+		references = container_context.get_references()
+		self.assertNumQueries(0, lambda: [references[(name, ct)].content.name for name in ('one', 'two')])
+		self.assertEqual(references[('two', ct)].content.name, 'two')
+		self.assertEqual(container_context.get_contentlets()['text'].content, 'Text')
+
+
+class RouteTableTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_get_route(self):
+		from philo.middleware import get_route
+		root = Node.objects.get(slug='root')
+		second2 = Node.objects.get(slug='second2')
+		
+		route, subpath = get_route('root/second2/sub/path/')
+		self.assertEqual((route[0], subpath), (second2.pk, 'sub/path'))
+		
+		route, subpath = get_route('second2', root.pk)
+		self.assertEqual((route[0], subpath), (second2.pk, None))
+		
+		route, subpath = get_route('missing', root.pk)
+		self.assertEqual((route[0], subpath), (root.pk, 'missing'))
+		self.assertEqual(get_route('missing/path'), (None, None))
+		
+		# Saving a node invalidates the table.
+		second2.slug = 'renamed'
+		second2.save()
+		route, subpath = get_route('renamed', root.pk)
+		self.assertEqual((route[0], subpath), (second2.pk, None))
+	
+	def test_get_node_with_view(self):
+		from philo import middleware
+		node = Node.objects.filter(view_object_id__isnull=False)[0]
+		path = node.get_path()
+		view = node.view
+		
+		old_cache_routes, middleware.CACHE_ROUTES = middleware.CACHE_ROUTES, True
+		try:
+			middleware.get_node(path)
+			
+			# Once the routes and view are cached, neither the node nor its view is queried.
+			settings.DEBUG = True
+			try:
+				queries = len(connection.queries)
+				routed = middleware.get_node(path)
+				self.assertEqual(routed.view, view)
+				self.assertEqual(len(connection.queries), queries)
+			finally:
+				settings.DEBUG = False
+		finally:
+			middleware.CACHE_ROUTES = old_cache_routes
+
+
+class NodeViewTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_prefetch_views(self):
+		nodes = list(Node.objects.filter(view_object_id__isnull=False))
+		expected = [node.view for node in nodes]
+		
+		settings.DEBUG = True
+		try:
+			nodes = list(Node.objects.filter(view_object_id__isnull=False).prefetch_views())
+			queries = len(connection.queries)
+			self.assertEqual([node.view for node in nodes], expected)
+			self.assertEqual(len(connection.queries), queries)
+		finally:
+			settings.DEBUG = False
+
+
+class CompiledTemplateTestCase(TestCase):
+	def test_get_compiled(self):
+		t = Template.objects.create(name='Compiled', slug='compiled', code='{{ a }}')
+		compiled = t.get_compiled()
+		self.assertTrue(t.get_compiled() is compiled)
+		self.assertEqual(compiled.render(template.Context({'a': 'b'})), 'b')
+		
+		# Unsaved changes to the code are never served from the cache.
+		t.code = '{{ a }}{{ a }}'
+		self.assertEqual(t.get_compiled().render(template.Context({'a': 'b'})), 'bb')
+		
+		# Saving a template invalidates every compiled template.
+		t.code = '{{ a }}'
+		t.save()
+		self.assertFalse(t.get_compiled() is compiled)
+	
+	def test_cached_loader(self):
+		from philo.loaders.database import CachedLoader
+		loader = CachedLoader()
+		parent = Template.objects.create(name='Parent', slug='parent', code='parent')
+		
+		settings.DEBUG = True
+		try:
+			self.assertEqual(loader.load_template('parent')[0].render(template.Context()), 'parent')
+			self.assertRaises(template.TemplateDoesNotExist, loader.load_template, 'parent/child')
+			queries = len(connection.queries)
+			loader.load_template('parent')
+			self.assertRaises(template.TemplateDoesNotExist, loader.load_template, 'parent/child')
+			self.assertEqual(len(connection.queries), queries)
+		finally:
+			settings.DEBUG = False
+		
+		# Negative lookups are forgotten when templates change.
+		Template.objects.create(name='Child', slug='child', code='child', parent=parent)
+		self.assertEqual(loader.load_template('parent/child')[0].render(template.Context()), 'child')
+		
+		# So are the paths of descendants when an ancestor's slug changes.
+		parent.slug = 'renamed'
+		parent.save()
+		self.assertRaises(template.TemplateDoesNotExist, loader.load_template, 'parent/child')
+		self.assertEqual(loader.load_template('renamed/child')[0].render(template.Context()), 'child')
+
+
+class TreeAttributeTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_get_tree_attributes(self):
+		from philo.models.base import get_tree_attributes
+		from philo.utils.entities import TreeAttributeMapper
+		
+		root = Node.objects.get(slug='root')
+		root.attributes['inherited'] = 'root'
+		for node in root.get_descendants():
+			expected = dict([(attr.key, attr.pk) for attr in TreeAttributeMapper(node).get_attributes()])
+			self.assertTrue('inherited' in expected)
+			self.assertEqual(dict([(key, attr.pk) for key, attr in get_tree_attributes(node).items()]), expected)
+
+
+class AttributePrefetchTestCase(TestCase):
+	def test_entity_managers(self):
+		from philo.models import EntityManager
+		from philo.models.nodes import NodeManager
+		# Entities without managers of their own get an EntityManager; others keep theirs.
+		self.assertEqual(type(Page._default_manager), EntityManager)
+		self.assertEqual(type(Node._default_manager), NodeManager)
+	
+	def test_prefetch_attributes(self):
+		for i in xrange(3):
+			page = Page.objects.create(template=Template.objects.create(name='t%d' % i, slug='t%d' % i, code=''), title='p%d' % i)
+			page.attributes['number'] = i
+			page.attributes['template'] = page.template
+			page.attributes['templates'] = Template.objects.filter(pk=page.template.pk)
+		
+		pages = list(Page.objects.prefetch_attributes())
+		
+		def get_values():
+			# Mapped values are SimpleLazyObjects, which don't support iteration in django 1.3.
+			return [(sorted(page.attributes.keys()), page.attributes['number'], page.attributes['template'].name, [t.name for t in page.attributes['templates'].__iter__()]) for page in pages]
+		self.assertNumQueries(0, get_values)
+		keys = ['number', 'template', 'templates']
+		self.assertEqual(get_values(), [(keys, 0, 't0', ['t0']), (keys, 1, 't1', ['t1']), (keys, 2, 't2', ['t2'])])
+
+
+class AttributeProxyFieldTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_save_attribute_fields(self):
+		from philo.models.fields.entities import JSONAttribute, ForeignKeyAttribute, save_attribute_fields
+		node = Node.objects.get(slug='root')
+		# An attribute which already exists (e.g. created by another handler) is updated, not duplicated.
+		node.attributes['number'] = 1
+		number = JSONAttribute(attribute_key='number')
+		parent = ForeignKeyAttribute(Node, attribute_key='parent_node')
+		number.name, parent.name = 'number_field', 'parent_field'
+		node.__dict__['number_field'] = 2
+		node.__dict__['parent_field'] = node
+		
+		save_attribute_fields(node, set([number, parent]), set())
+		self.assertEqual(node.attribute_set.filter(key='number').count(), 1)
+		node = Node.objects.get(pk=node.pk)
+		self.assertEqual(node.attributes['number'], 2)
+		self.assertEqual(node.attributes['parent_node'], node)
+		
+		# Unchanged values aren't written again.
+		node.__dict__['number_field'] = 2
+		node.__dict__['parent_field'] = node
+		settings.DEBUG = True
+		try:
+			queries = len(connection.queries)
+			save_attribute_fields(node, set([number, parent]), set())
+			writes = [query['sql'] for query in connection.queries[queries:] if not query['sql'].startswith('SELECT')]
+			self.assertEqual(writes, [])
+		finally:
+			settings.DEBUG = False
+		
+		# Values which are only == to the stored one are still written.
+		node.__dict__['number_field'] = 2.0
+		save_attribute_fields(node, set([number]), set())
+		self.assertEqual(Node.objects.get(pk=node.pk).attributes['number'], 2.0)
+		self.assertTrue(isinstance(node.attribute_set.get(key='number').value.value, float))
+	
+	def test_value_type_changes(self):
+		from philo.models import ForeignKeyValue
+		node = Node.objects.get(slug='root')
+		node.attributes['thing'] = 1
+		attribute = node.attribute_set.get(key='thing')
+		
+		# Make the new ForeignKeyValue share the old JSONValue's pk.
+		ForeignKeyValue.objects.all().delete()
+		if attribute.value_object_id > 1:
+			ForeignKeyValue.objects.create(pk=attribute.value_object_id - 1)
+		attribute.set_value(node, ForeignKeyValue)
+		
+		attribute = node.attribute_set.get(key='thing')
+		self.assertEqual(attribute.value_content_type_id, ContentType.objects.get_for_model(ForeignKeyValue).pk)
+		self.assertEqual(attribute.value.value, node)
+
+
+class InlineAttributeValueTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_inline_values(self):
+		from philo.models import base
+		node = Node.objects.get(slug='root')
+		node.attributes['stored'] = {'a': 1}
+		
+		old_inline, base.INLINE_JSON_VALUES = base.INLINE_JSON_VALUES, True
+		try:
+			node.attributes['inline'] = [1, 2]
+		finally:
+			base.INLINE_JSON_VALUES = old_inline
+		
+		attribute = node.attribute_set.get(key='inline')
+		self.assertEqual(attribute.value_content_type_id, None)
+		self.assertEqual(attribute.inline_value, [1, 2])
+		
+		node = Node.objects.get(pk=node.pk)
+		self.assertEqual(node.attributes['inline'], [1, 2])
+		self.assertEqual(node.attributes['stored'], {'a': 1})
+		
+		# Cached tree attributes are discarded along with the JSONValues.
+		from philo.models.nodes import content_cache
+		old_cache, base.CACHE_TREE_ATTRIBUTES = base.CACHE_TREE_ATTRIBUTES, True
+		try:
+			self.assertEqual(base.get_tree_attributes(node)['stored'].value_content_type_id, ContentType.objects.get_for_model(base.JSONValue).pk)
+			version = content_cache.get_version()
+			self.assertEqual(base.inline_json_values(node.attribute_set.all()), 1)
+			self.assertNotEqual(content_cache.get_version(), version)
+			self.assertEqual(base.get_tree_attributes(node)['stored'].inline_value, {'a': 1})
+		finally:
+			base.CACHE_TREE_ATTRIBUTES = old_cache
+			# Don't leave the tree's map behind for later tests.
+			base._get_tree_attribute_cache(ContentType.objects.get_for_model(node).pk, node.tree_id).invalidate()
+		self.assertEqual(node.attribute_set.get(key='stored').inline_value, {'a': 1})
+		node = Node.objects.get(pk=node.pk)
+		self.assertEqual(node.attributes['stored'], {'a': 1})
+
+
+class ManyToManyValueTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_set_value(self):
+		from philo.models import ManyToManyValue
+		nodes = Node.objects.order_by('pk')
+		pks = list(nodes.values_list('pk', flat=True))
+		value = ManyToManyValue()
+		
+		value.set_value(nodes.filter(pk__in=pks[:3]))
+		self.assertEqual(sorted(value.object_ids), pks[:3])
+		
+		value.set_value(nodes.filter(pk__in=pks[1:4]))
+		self.assertEqual(sorted(value.object_ids), pks[1:4])
+		self.assertEqual(value.values.count(), 3)
+		
+		value.set_value(nodes.none())
+		self.assertEqual(list(value.object_ids), [])
+		
+		# Values which belong to other attributes are left alone.
+		from philo.models import ForeignKeyValue
+		standalone = ForeignKeyValue.objects.create(content_type=ContentType.objects.get_for_model(Node), object_id=pks[0])
+		value.set_value(nodes.filter(pk__in=pks[:2]))
+		self.assertEqual(sorted(value.object_ids), pks[:2])
+		self.assertFalse(value.values.filter(pk=standalone.pk).exists())
+		self.assertTrue(ForeignKeyValue.objects.filter(pk=standalone.pk).exists())
+	
+	def test_signals(self):
+		from django.db.models.signals import m2m_changed
+		from philo.models import ManyToManyValue
+		nodes = Node.objects.order_by('pk')
+		pks = list(nodes.values_list('pk', flat=True))
+		value = ManyToManyValue()
+		value.set_value(nodes.filter(pk__in=pks[:2]))
+		old_pks = set(value.values.values_list('pk', flat=True))
+		
+		sent = []
+		def receiver(sender, instance, action, pk_set, **kwargs):
+			sent.append((action, pk_set))
+		m2m_changed.connect(receiver, sender=ManyToManyValue.values.through)
+		try:
+			value.set_value(nodes.filter(pk__in=pks[2:3]))
+		finally:
+			m2m_changed.disconnect(receiver, sender=ManyToManyValue.values.through)
+		
+		new_pks = set(value.values.values_list('pk', flat=True))
+		self.assertEqual(sent, [('pre_remove', old_pks), ('post_remove', old_pks), ('pre_add', new_pks), ('post_add', new_pks)])
+
+
+class JSONFieldTestCase(TestCase):
+	def test_parse_cache(self):
+		from philo.models import JSONValue
+		value1 = JSONValue(value_json='{"a": [1, 2]}')
+		value2 = JSONValue(value_json='{"a": [1, 2]}')
+		
+		# Changes to one decoded value must not leak into another.
+		value1.value['a'].append(3)
+		self.assertEqual(value2.value, {'a': [1, 2]})
+		
+		# Setting an equal value keeps the json string it was decoded from, even
+		# once that string has left the parse cache.
+		from philo.models.fields import json_parse_cache
+		value3 = JSONValue(value_json='{"a":[1,2]}')
+		value3.value
+		json_parse_cache.clear()
+		value3.value = {'a': [1, 2]}
+		self.assertEqual(value3.value_json, '{"a":[1,2]}')
+		value3.value = {'a': [1, True]}
+		self.assertEqual(value3.value, {'a': [1, True]})
+		self.assertNotEqual(value3.value_json, '{"a":[1,2]}')
+		
+		# Values changed in place are encoded again.
+		value4 = JSONValue(value_json='{"a":[1,2]}')
+		value4.value['a'].append(3)
+		value4.value = value4.value
+		self.assertEqual(json.loads(value4.value_json), {'a': [1, 2, 3]})
+		
+		# So are values whose json string was replaced after decoding.
+		value5 = JSONValue(value_json='{"a":[1,2]}')
+		value5.value
+		value5.value_json = '[]'
+		value5.value = {'a': [1, 2]}
+		self.assertEqual(json.loads(value5.value_json), {'a': [1, 2]})
+
+
+class URLContextTestCase(TestCase):
+	fixtures = ['test_fixtures.json']
+	
+	def test_path_memoization(self):
+		from philo.models.nodes import url_context
+		node = Node.objects.filter(parent__isnull=False)[0]
+		other = Node.objects.get(pk=node.pk)
+		
+		url_context.activate()
+		try:
+			path = url_context.get_path(node)
+			self.assertEqual(path, node.get_path())
+			self.assertNumQueries(0, url_context.get_path, other)
+		finally:
+			url_context.deactivate()
+		self.assertFalse(url_context._paths)
+
+
+class ViewURLResolverTestCase(TestCase):
+	def setUp(self):
+		self.page = Page.objects.create(template=Template.objects.create(name='t', slug='t', code=''), title='p')
+	
+	def get_view(self):
+		# Page has no urlpatterns of its own; give each instance some whose callback returns the instance.
+		from django.conf.urls.defaults import patterns, url
+		view = Page.objects.get(pk=self.page.pk)
+		view.urlpatterns = patterns('', url(r'^(?P<slug>[-\w]+)$', lambda request, slug: view, name='item'))
+		return view
+	
+	def test_url_resolvers(self):
+		first, second = self.get_view(), self.get_view()
+		shared = first.get_reverse_resolver()
+		
+		# Requests are resolved to the instance which handles them, even if another instance built the shared resolver.
+		callback, args, kwargs = second.get_url_resolver().resolve('/item')
+		self.assertTrue(callback(None, **kwargs) is second)
+		self.assertTrue(second.get_reverse_resolver() is shared)
+		
+		# Changing the view's fields gives it a new resolver.
+		resolver = second.get_url_resolver()
+		second.title = 'q'
+		self.assertFalse(second.get_url_resolver() is resolver)
+		self.assertFalse(second.get_reverse_resolver() is shared)
+	
+	def test_reverse_memo(self):
+		view = self.get_view()
+		self.assertEqual(view.get_subpath('item', kwargs={'slug': 'a'}), '/a')
+		resolver = view.get_reverse_resolver()
+		self.assertEqual(resolver._reverse_memo.get(('item', (), (('slug', u'a'),))), u'a')
+		
+		# Memoized reversals are returned unchanged.
+		self.assertNumQueries(0, view.get_subpath, 'item', kwargs={'slug': 'a'})
+		self.assertEqual(view.get_subpath('item', kwargs={'slug': 'b'}), '/b')
+		self.assertRaises(NoReverseMatch, view.get_subpath, 'missing')
+
+
+class RangeHeaderTestCase(TestCase):
+	def test_parse_range_header(self):
+		from philo.utils.http import parse_range_header
+		self.assertEqual(parse_range_header('bytes=0-9', 100), [(0, 9)])
+		self.assertEqual(parse_range_header('bytes=-5, 10-', 100), [(10, 99)])
+		self.assertEqual(parse_range_header('bytes=50-200', 100), [(50, 99)])
+		self.assertEqual(parse_range_header('bytes=100-', 100), [])
+		self.assertEqual(parse_range_header('bytes=5-2', 100), None)
+		self.assertEqual(parse_range_header('lines=0-9', 100), None)
+		# Overlapping and adjacent ranges are merged and sorted.
+		self.assertEqual(parse_range_header('bytes=20-29, 0-9, 10-14, 25-39, 50-59', 100), [(0, 14), (20, 39), (50, 59)])
+		# Headers without any ranges, or with too many, are ignored.
+		self.assertEqual(parse_range_header('bytes=', 100), None)
+		self.assertEqual(parse_range_header('bytes= , ', 100), None)
+		self.assertEqual(parse_range_header('bytes=%s' % ','.join(['0-1'] * 21), 100, max_ranges=20), None)
+		self.assertEqual(parse_range_header('bytes=%s' % ','.join(['0-1'] * 20), 100, max_ranges=20), [(0, 1)])
+
+
+class AcceptNegotiationTestCase(TestCase):
+	def test_negotiate_mime_type(self):
+		from philo.utils.http import negotiate_mime_type
+		offered = ('application/atom+xml', 'application/rss+xml')
+		self.assertEqual(negotiate_mime_type(None, offered, 'application/atom+xml'), 'application/atom+xml')
+		self.assertEqual(negotiate_mime_type('*/*', offered, 'application/atom+xml'), 'application/atom+xml')
+		self.assertEqual(negotiate_mime_type('application/rss+xml', offered, 'application/atom+xml'), 'application/rss+xml')
+		self.assertEqual(negotiate_mime_type('text/html', offered, 'application/atom+xml'), None)
+		self.assertEqual(negotiate_mime_type('text/html', (), 'application/atom+xml'), None)
+		# Cached results, including failures, are returned unchanged.
+		self.assertEqual(negotiate_mime_type('text/html', offered, 'application/atom+xml'), None)
+		self.assertEqual(negotiate_mime_type('application/rss+xml', offered, 'application/atom+xml'), 'application/rss+xml')
+
+
+class ResponseCacheTestCase(TestCase):
+	def setUp(self):
+		from philo.models import Contentlet
+		template = Template.objects.create(name='Cached', slug='cached', code='{% container text %}')
+		self.page = Page.objects.create(template=template, title='Cached')
+		self.contentlet = Contentlet.objects.create(page=self.page, name='text', content='Cached')
+		self.node = Node.objects.create(slug='cached', view=self.page)
+	
+	def get_request(self, method='get', **extra):
+		from django.test.client import RequestFactory
+		request = getattr(RequestFactory(), method)('/cached', **extra)
+		request.node = self.node
+		self.node._subpath = '/'
+		return request
+	
+	def test_response_cache(self):
+		self.page.response_cache_timeout = 60
+		response = self.page.render_to_response(self.get_request())
+		self.assertEqual(response.content, 'Cached')
+		self.assertTrue('Accept' in response['Vary'])
+		
+		# Hits don't render the page or look up attributes.
+		self.contentlet.__class__.objects.filter(pk=self.contentlet.pk).update(content='Changed')
+		settings.DEBUG = True
+		try:
+			queries = len(connection.queries)
+			self.assertEqual(self.page.render_to_response(self.get_request()).content, 'Cached')
+			self.assertEqual(len(connection.queries), queries)
+		finally:
+			settings.DEBUG = False
+		
+		# Responses for other representations are cached separately.
+		self.assertEqual(self.page.render_to_response(self.get_request(HTTP_ACCEPT='text/plain')).content, 'Changed')
+		
+		# Saving content starts a new generation.
+		self.contentlet.content = 'Saved'
+		self.contentlet.save()
+		self.assertEqual(self.page.render_to_response(self.get_request()).content, 'Saved')
+	
+	def test_head_requests(self):
+		self.page.response_cache_timeout = 60
+		
+		# Responses to HEAD requests aren't cached...
+		self.page.render_to_response(self.get_request('head'))
+		self.contentlet.__class__.objects.filter(pk=self.contentlet.pk).update(content='Changed')
+		self.assertEqual(self.page.render_to_response(self.get_request()).content, 'Changed')
+		
+		# ...but they are answered with cached responses to GET requests.
+		self.contentlet.__class__.objects.filter(pk=self.contentlet.pk).update(content='Changed again')
+		self.assertEqual(self.page.render_to_response(self.get_request('head')).content, 'Changed')
+	
+	def test_conditional_responses(self):
+		# Validators are opt-in.
+		self.assertFalse(self.page.render_to_response(self.get_request()).has_header('ETag'))
+		
+		self.page.conditional_responses = True
+		etag = self.page.render_to_response(self.get_request())['ETag']
+		self.assertEqual(self.page.render_to_response(self.get_request(HTTP_IF_NONE_MATCH=etag)).status_code, 304)
+		
+		# Other representations have other tags.
+		response = self.page.render_to_response(self.get_request(HTTP_ACCEPT='text/plain', HTTP_IF_NONE_MATCH=etag))
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response['ETag'], etag)
+		
+		# So does every new content generation.
+		self.contentlet.save()
+		self.assertEqual(self.page.render_to_response(self.get_request(HTTP_IF_NONE_MATCH=etag)).status_code, 200)
+		
+		# Views rendered on behalf of another view aren't validated.
+		other = Page.objects.create(template=self.page.template, title='Other')
+		self.node.view = other
+		self.node.save()
+		self.assertFalse(self.page.render_to_response(self.get_request()).has_header('ETag'))
+
+
+@unittest.skipUnless('philo.contrib.penfield' in settings.INSTALLED_APPS, "FeedViews are tested with philo.contrib.penfield's BlogView.")
+class FeedViewTestCase(TestCase):
+	def setUp(self):
+		from datetime import datetime
+		from django.contrib.auth.models import User
+		from philo.contrib.penfield.models import Blog, BlogEntry, BlogView
+		template = Template.objects.create(name='Blog', slug='blog', code='{{ entries|length }}')
+		page = Page.objects.create(template=template, title='Blog')
+		author = User.objects.create(username='author', first_name='Jane', last_name='Author')
+		self.blog = Blog.objects.create(title='Blog', slug='blog')
+		self.view = BlogView.objects.create(blog=self.blog, index_page=page, entry_page=page, tag_page=page, entry_permalink_style='N', feed_length=None)
+		self.node = Node.objects.create(slug='blog', view=self.view)
+		self.entries = [BlogEntry.objects.create(title='Entry %d' % i, slug='entry-%d' % i, blog=self.blog, author=author, date=datetime(2011, 1, i), content='Entry') for i in (1, 2, 3)]
+	
+	def get_request(self, subpath='/', **extra):
+		from django.test.client import RequestFactory
+		request = RequestFactory().get('/blog%s' % subpath, **extra)
+		request.node = self.node
+		self.node._subpath = subpath
+		return request
+	
+	def test_feed_item_cache_key(self):
+		entry = self.entries[0]
+		key = self.view.get_feed_item_cache_key(self.get_request(), entry)
+		self.assertEqual(self.view.get_feed_item_cache_key(self.get_request(), entry), key)
+		
+		# Tagging an item or moving the node which its link goes through gives it a new key.
+		entry.tags.add('news')
+		tagged_key = self.view.get_feed_item_cache_key(self.get_request(), entry)
+		self.assertNotEqual(tagged_key, key)
+		
+		self.node.slug = 'news'
+		self.node.save()
+		moved_key = self.view.get_feed_item_cache_key(self.get_request(), entry)
+		self.assertNotEqual(moved_key, tagged_key)
+		
+		# Other content changing doesn't affect the key...
+		self.entries[1].title = 'Changed'
+		self.entries[1].save()
+		Page.objects.create(template=Template.objects.create(name='Other', slug='other', code=''), title='Other')
+		self.assertEqual(self.view.get_feed_item_cache_key(self.get_request(), entry), moved_key)
+		
+		# ...but changes to the item or to its templates do.
+		entry.title = 'Changed'
+		entry.save()
+		changed_key = self.view.get_feed_item_cache_key(self.get_request(), entry)
+		self.assertNotEqual(changed_key, moved_key)
+		
+		self.view.item_title_template = title = Template.objects.create(name='Item title', slug='item-title', code='{{ obj.title }}')
+		templated_key = self.view.get_feed_item_cache_key(self.get_request(), entry)
+		self.assertNotEqual(templated_key, changed_key)
+		title.code = '{{ obj.title|upper }}'
+		title.save()
+		self.assertNotEqual(self.view.get_feed_item_cache_key(self.get_request(), entry), templated_key)
+	
+	def test_item_templates(self):
+		from philo.contrib.winer.models import render_item_template
+		title = Template.objects.create(name='Item title', slug='item-title', code='{{ obj.title }}{% if blog %} in {{ blog }}{% endif %}')
+		compiled = title.get_compiled()
+		
+		# Each item is rendered against the shared context and then popped off it again.
+		context = template.Context({'blog': 'Blog'})
+		self.assertEqual([render_item_template(compiled, context, entry) for entry in self.entries], ['Entry 1 in Blog', 'Entry 2 in Blog', 'Entry 3 in Blog'])
+		self.assertFalse('obj' in context)
+		
+		self.view.item_title_template = title
+		items = list(self.view.iter_feed_items(self.entries, self.get_request()))
+		self.assertEqual([item['title'] for item in items], ['Entry 1', 'Entry 2', 'Entry 3'])
+	
+	def test_prefetch_feed_items(self):
+		from philo.contrib.penfield.models import BlogEntry
+		from philo.contrib.winer.models import _dynamic_attr_accessors
+		self.entries[0].tags.add('news')
+		entries = list(BlogEntry.objects.filter(blog=self.blog).order_by('date'))
+		
+		# Once prefetched, the authors and tags of the items don't cause any more queries.
+		self.view.prefetch_feed_items(entries)
+		get_item_data = lambda: [(self.view.item_author_name(entry), self.view.item_categories(entry)) for entry in entries]
+		self.assertNumQueries(0, get_item_data)
+		self.assertEqual(get_item_data(), [('Jane Author', ['news']), ('Jane Author', []), ('Jane Author', [])])
+		
+		# Each class's dynamic attributes are only inspected once.
+		items = list(self.view.iter_feed_items(entries, self.get_request()))
+		self.assertEqual([item['categories'] for item in items], [['news'], [], []])
+		self.assertTrue((self.view.__class__, 'item_categories') in _dynamic_attr_accessors)
+	
+	def test_stream_feed(self):
+		from StringIO import StringIO
+		from philo.contrib.penfield.models import BlogEntry
+		request = self.get_request('/atom')
+		obj = self.view.get_object(request)
+		# Oldest first, so the latest post date isn't the first item's.
+		items = BlogEntry.objects.filter(blog=self.blog).order_by('date')
+		self.assertEqual(self.view.get_latest_post_date(items), self.entries[-1].date)
+		self.assertEqual(self.view.get_latest_post_date(list(items)), self.entries[-1].date)
+		
+		streamed = ''.join(self.view.stream_feed(self.view.get_feed(obj, request, 'index', 'atom'), items, request))
+		self.assertEqual(streamed.count('<entry>'), 3)
+		
+		# The streamed document is the same as one written in one go.
+		feed = self.view.get_feed(obj, request, 'index', 'atom')
+		self.view.populate_feed(feed, items, request)
+		out = StringIO()
+		feed.write(out, 'utf-8')
+		self.assertEqual(streamed, out.getvalue())
+		
+		# Documents read after the request has finished are rendered with the
+		# request's url context, which is deactivated again afterwards.
+		from philo.models.nodes import url_context
+		url_context.activate()
+		try:
+			stream = self.view.stream_feed(self.view.get_feed(obj, request, 'index', 'atom'), items, request)
+		finally:
+			url_context.deactivate()
+		chunks = [stream.next(), stream.next()]
+		self.assertTrue(url_context.active)
+		chunks.extend(stream)
+		self.assertFalse(url_context.active)
+		self.assertEqual(''.join(chunks), streamed)
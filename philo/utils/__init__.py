@@ -1,4 +1,6 @@
-from django.db import models
+from functools import wraps
+
+from django.db import models, transaction
 from django.contrib.contenttypes.models import ContentType
 from django.core.paginator import Paginator, EmptyPage
 
@@ -25,6 +27,18 @@ def fattr(*args, **kwargs):
 	return wrapper
 
 
+def commit_on_success_unless_managed(func):
+	"""
+	Works like :func:`django.db.transaction.commit_on_success`, except that if a transaction is already being managed - for example, by :class:`~django.middleware.transaction.TransactionMiddleware`, by the admin, or by a caller's own :func:`~django.db.transaction.commit_on_success` - the decorated function simply runs as part of it. Django's transaction decorators can't be nested; an inner one would commit the outer transaction halfway through.
+	
+	"""
+	def inner(*args, **kwargs):
+		if transaction.is_managed():
+			return func(*args, **kwargs)
+		return transaction.commit_on_success(func)(*args, **kwargs)
+	return wraps(func)(inner)
+
+
 ### ContentTypeLimiters
 
 
@@ -92,6 +106,65 @@ class ContentTypeSubclassLimiter(ContentTypeLimiter):
 		return models.Q(pk__in=contenttype_pks)
 
 
+### Bulk loading
+
+
+def fill_fk_caches(instances, field_name):
+	"""Fetches the objects related to each of ``instances`` through the :class:`ForeignKey` named ``field_name`` with a single query and caches them on the instances, so that accessing the field will not cause another query."""
+	if not instances:
+		return
+	field = instances[0]._meta.get_field(field_name)
+	ids = set([getattr(instance, field.attname) for instance in instances])
+	ids.discard(None)
+	if not ids:
+		return
+	related = field.rel.to._default_manager.in_bulk(list(ids))
+	cache_name = field.get_cache_name()
+	for instance in instances:
+		value = getattr(instance, field.attname)
+		if value in related:
+			setattr(instance, cache_name, related[value])
+
+
+def fill_gfk_caches(instances, field_name):
+	"""Fetches the objects related to each of ``instances`` through the :class:`GenericForeignKey` named ``field_name`` with one query per content type and caches them on the instances."""
+	if not instances:
+		return
+	field = getattr(instances[0].__class__, field_name)
+	ct_attname = instances[0]._meta.get_field(field.ct_field).attname
+	lookups = {}
+	for instance in instances:
+		ct_id = getattr(instance, ct_attname)
+		pk = getattr(instance, field.fk_field)
+		if ct_id is not None and pk not in (None, ''):
+			lookups.setdefault(ct_id, set()).add(pk)
+	
+	related = {}
+	for ct_id, pks in lookups.items():
+		model = ContentType.objects.get_for_id(ct_id).model_class()
+		for pk, obj in model._default_manager.in_bulk(list(pks)).items():
+			# Object ids may be stored as text, so compare them as unicode.
+			related[(ct_id, unicode(pk))] = obj
+	
+	for instance in instances:
+		key = (getattr(instance, ct_attname), unicode(getattr(instance, field.fk_field)))
+		if key in related:
+			setattr(instance, field.cache_attr, related[key])
+
+
+def get_m2m_bulk(instances, field_name):
+	"""Returns a dictionary mapping the pk of each of ``instances`` to a list of the objects related to it through the :class:`ManyToManyField` named ``field_name``. The related objects are fetched with a single query."""
+	if not instances:
+		return {}
+	field = instances[0]._meta.get_field(field_name)
+	source = field.m2m_field_name()
+	target = field.m2m_reverse_field_name()
+	related = {}
+	for row in field.rel.through._default_manager.filter(**{'%s__in' % source: [instance.pk for instance in instances]}).select_related(target):
+		related.setdefault(getattr(row, '%s_id' % source), []).append(getattr(row, target))
+	return related
+
+
 ### Pagination
 
 
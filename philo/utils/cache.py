@@ -0,0 +1,131 @@
+from threading import Lock
+from time import time
+
+from django.core.cache import cache
+
+
+class VersionedCache(object):
+	"""
+	A per-process dictionary which is emptied whenever its version changes. The version is kept in django's cache backend, so every process which shares that backend will see an :meth:`invalidate` made by any of them the next time it accesses the :class:`VersionedCache`.
+	
+	:param name: A name which identifies the cache. This is used to build the cache key holding the version.
+	
+	"""
+	def __init__(self, name):
+		self.version_key = "PHILO_CACHE_VERSION__%s" % name
+		self.modified_key = "PHILO_CACHE_MODIFIED__%s" % name
+		self._version = None
+		self._data = {}
+	
+	def get_version(self):
+		"""Returns the current shared version, initializing it if necessary."""
+		version = cache.get(self.version_key)
+		if version is None:
+			# Start from the current time rather than from 1 so that a version
+			# which was evicted from the cache is not reused.
+			cache.add(self.version_key, int(time() * 1000))
+			version = cache.get(self.version_key)
+		return version
+	
+	def get_modified(self):
+		"""Returns the time of the last :meth:`invalidate` as a unix timestamp. If that time isn't known, the current time is recorded and returned instead."""
+		modified = cache.get(self.modified_key)
+		if modified is None:
+			cache.add(self.modified_key, int(time()))
+			modified = cache.get(self.modified_key)
+		return modified
+	
+	def sync(self):
+		"""Empties the local data if the shared version has changed since it was last checked."""
+		version = self.get_version()
+		if version != self._version:
+			self._data = {}
+			self._version = version
+	
+	def get(self, key, default=None):
+		"""Returns the value stored for ``key`` if the shared version has not changed, or ``default``."""
+		self.sync()
+		return self._data.get(key, default)
+	
+	def set(self, key, value):
+		"""Stores ``value`` for ``key`` in the local data."""
+		self._data[key] = value
+	
+	def invalidate(self):
+		"""Increments the shared version, records the time of the change, and empties the local data."""
+		cache.set(self.modified_key, int(time()))
+		try:
+			version = cache.incr(self.version_key)
+		except ValueError:
+			version = None
+		self._data = {}
+		self._version = version
+
+
+class LRUCache(object):
+	"""
+	A per-process dictionary which holds at most ``size`` items, discarding the least recently used item when it is full. Access is guarded by a lock so that instances can be shared between threads.
+	
+	:param size: The maximum number of items to hold. If this is not greater than zero, nothing will be stored.
+	
+	"""
+	def __init__(self, size):
+		self.size = size
+		self._lock = Lock()
+		self.clear()
+	
+	def clear(self):
+		"""Empties the cache."""
+		self._lock.acquire()
+		try:
+			# Each link is [previous, next, key, value]; the root link marks both ends of the list.
+			self._root = root = []
+			root[:] = [root, root, None, None]
+			self._links = {}
+		finally:
+			self._lock.release()
+	
+	def get(self, key, default=None):
+		"""Returns the value stored for ``key`` and marks it as the most recently used, or returns ``default``."""
+		self._lock.acquire()
+		try:
+			link = self._links.get(key)
+			if link is None:
+				return default
+			previous, next, key, value = link
+			previous[1] = next
+			next[0] = previous
+			root = self._root
+			last = root[0]
+			last[1] = root[0] = link
+			link[0] = last
+			link[1] = root
+			return value
+		finally:
+			self._lock.release()
+	
+	def set(self, key, value):
+		"""Stores ``value`` for ``key``, discarding the least recently used item if the cache is full."""
+		if self.size <= 0:
+			return
+		self._lock.acquire()
+		try:
+			links = self._links
+			root = self._root
+			if key in links:
+				link = links.pop(key)
+				link[0][1] = link[1]
+				link[1][0] = link[0]
+			elif len(links) >= self.size:
+				oldest = root[1]
+				root[1] = oldest[1]
+				oldest[1][0] = root
+				del links[oldest[2]]
+			last = root[0]
+			link = [last, root, key, value]
+			last[1] = root[0] = links[key] = link
+		finally:
+			self._lock.release()
+	
+	def __len__(self):
+		return len(self._links)
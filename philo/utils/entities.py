@@ -10,6 +10,13 @@ from philo.utils.lazycompat import SimpleLazyObject
 ### AttributeMappers
 
 
+def _get_attribute_value(attribute):
+	# Values without a related value model are stored inline on the attribute.
+	if attribute.value_content_type_id is None:
+		return attribute.inline_value
+	return getattr(attribute.value, 'value', None)
+
+
 class AttributeMapper(object, DictMixin):
 	"""
 	Given an :class:`~philo.models.base.Entity` subclass instance, this class allows dictionary-style access to the :class:`~philo.models.base.Entity`'s :class:`~philo.models.base.Attribute`\ s. In order to prevent unnecessary queries, the :class:`AttributeMapper` will cache all :class:`~philo.models.base.Attribute`\ s and the associated python values when it is first accessed.
@@ -47,7 +54,7 @@ class AttributeMapper(object, DictMixin):
 			value_class = JSONValue
 		
 		attribute.set_value(value=value, value_class=value_class)
-		self._cache[key] = attribute.value.value
+		self._cache[key] = _get_attribute_value(attribute)
 		self._attributes_cache[key] = attribute
 	
 	def get_attributes(self):
@@ -86,14 +93,19 @@ class AttributeMapper(object, DictMixin):
 		value_lookups = {}
 		
 		for a in attributes:
-			value_lookups.setdefault(a.value_content_type_id, []).append(a.value_object_id)
-			self._attributes_cache[a.key] = a
+			if a.value_content_type_id is not None:
+				value_lookups.setdefault(a.value_content_type_id, []).append(a.value_object_id)
 		
 		values_bulk = dict(((ct_pk, SimpleLazyObject(partial(ContentType.objects.get_for_id(ct_pk).model_class().objects.in_bulk, pks))) for ct_pk, pks in value_lookups.items()))
 		
+		self._fill_cache_from_bulk(attributes, values_bulk)
+	
+	def _fill_cache_from_bulk(self, attributes, values_bulk):
+		"""Fills the cache with ``attributes``, whose values will be looked up in ``values_bulk`` - a dictionary mapping value content type pks to dictionaries of values by pk."""
 		cache = {}
 		
 		for a in attributes:
+			self._attributes_cache[a.key] = a
 			cache[a.key] = SimpleLazyObject(partial(self._lazy_value_from_bulk, values_bulk, a))
 			a._value_cache = cache[a.key]
 		
@@ -101,6 +113,8 @@ class AttributeMapper(object, DictMixin):
 		self._cache_filled = True
 	
 	def _lazy_value_from_bulk(self, bulk, attribute):
+		if attribute.value_content_type_id is None:
+			return attribute.inline_value
 		v = bulk[attribute.value_content_type_id].get(attribute.value_object_id)
 		return getattr(v, 'value', None)
 	
@@ -133,7 +147,7 @@ class LazyAttributeMapperMixin(object):
 		except Attribute.DoesNotExist:
 			raise KeyError
 		else:
-			val = getattr(attr.value, 'value', None)
+			val = _get_attribute_value(attr)
 			self._cache[key] = val
 			self._attributes_cache[key] = attr
 
@@ -146,8 +160,11 @@ class LazyAttributeMapper(LazyAttributeMapperMixin, AttributeMapper):
 class TreeAttributeMapper(AttributeMapper):
 	"""The :class:`~philo.models.base.TreeEntity` class allows the inheritance of :class:`~philo.models.base.Attribute`\ s down the tree. This mapper will return the most recently declared :class:`~philo.models.base.Attribute` among the :class:`~philo.models.base.TreeEntity`'s ancestors or set an attribute on the :class:`~philo.models.base.Entity` it is attached to."""
 	def get_attributes(self):
-		"""Returns a list of :class:`~philo.models.base.Attribute`\ s sorted by increasing parent level. When used to populate the cache, this will cause :class:`~philo.models.base.Attribute`\ s on the root to be overwritten by those on its children, etc."""
+		"""Returns a list of :class:`~philo.models.base.Attribute`\ s sorted by increasing parent level. When used to populate the cache, this will cause :class:`~philo.models.base.Attribute`\ s on the root to be overwritten by those on its children, etc. If :data:`~philo.models.base.CACHE_TREE_ATTRIBUTES` is ``True``, only the :class:`~philo.models.base.Attribute`\ s which take precedence are returned, from :func:`~philo.models.base.get_tree_attributes`."""
 		from philo.models import Attribute
+		from philo.models.base import CACHE_TREE_ATTRIBUTES, get_tree_attributes
+		if CACHE_TREE_ATTRIBUTES:
+			return get_tree_attributes(self.entity).values()
 		ancestors = dict(self.entity.get_ancestors(include_self=True).values_list('pk', 'level'))
 		ct = ContentType.objects.get_for_model(self.entity)
 		attrs = Attribute.objects.filter(entity_content_type=ct, entity_object_id__in=ancestors.keys())
@@ -157,6 +174,9 @@ class TreeAttributeMapper(AttributeMapper):
 class LazyTreeAttributeMapper(LazyAttributeMapperMixin, TreeAttributeMapper):
 	def get_attributes(self):
 		from philo.models import Attribute
+		from philo.models.base import CACHE_TREE_ATTRIBUTES, get_tree_attributes
+		if CACHE_TREE_ATTRIBUTES:
+			return [attr for key, attr in get_tree_attributes(self.entity).items() if key not in self._cache]
 		ancestors = dict(self.entity.get_ancestors(include_self=True).values_list('pk', 'level'))
 		ct = ContentType.objects.get_for_model(self.entity)
 		attrs = Attribute.objects.filter(entity_content_type=ct, entity_object_id__in=ancestors.keys()).exclude(key__in=self._cache.keys())
@@ -164,6 +184,12 @@ class LazyTreeAttributeMapper(LazyAttributeMapperMixin, TreeAttributeMapper):
 	
 	def _raw_get_attribute(self, key):
 		from philo.models import Attribute
+		from philo.models.base import CACHE_TREE_ATTRIBUTES, get_tree_attributes
+		if CACHE_TREE_ATTRIBUTES:
+			try:
+				return get_tree_attributes(self.entity)[key]
+			except KeyError:
+				raise Attribute.DoesNotExist
 		ancestors = dict(self.entity.get_ancestors(include_self=True).values_list('pk', 'level'))
 		ct = ContentType.objects.get_for_model(self.entity)
 		try:
@@ -0,0 +1,123 @@
+from django.conf import settings
+
+from philo.utils.cache import LRUCache
+
+try:
+	import mimeparse
+except:
+	mimeparse = None
+
+
+#: Holds the results of :func:`negotiate_mime_type`, keyed on the raw Accept header and the mime types which were offered. It holds at most :setting:`PHILO_ACCEPT_CACHE_SIZE` results; default: 500.
+accept_cache = LRUCache(getattr(settings, 'PHILO_ACCEPT_CACHE_SIZE', 500))
+
+
+def parse_range_header(header, size, max_ranges=None):
+	"""
+	Parses the value of an HTTP ``Range`` header for a resource of ``size`` bytes.
+	
+	:param max_ranges: The largest number of ranges the header may list, or ``None`` for no limit. Headers which list more are ignored, since answering them can take far more work than sending the whole resource.
+	:returns: A list of (``first``, ``last``) tuples giving the inclusive byte positions of each satisfiable range, in ascending order and with overlapping or adjacent ranges merged. The list will be empty if none of the ranges can be satisfied. If the header is malformed, lists no ranges or too many ranges, or does not use byte units, returns ``None``, in which case the header should be ignored.
+	
+	"""
+	units, sep, specs = header.partition('=')
+	if not sep or units.strip().lower() != 'bytes':
+		return None
+	
+	specs = [spec.strip() for spec in specs.split(',') if spec.strip()]
+	if not specs or max_ranges is not None and len(specs) > max_ranges:
+		return None
+	
+	ranges = []
+	for spec in specs:
+		first, sep, last = spec.partition('-')
+		if not sep:
+			return None
+		first, last = first.strip(), last.strip()
+		try:
+			if not first:
+				# A suffix range: the last ``last`` bytes of the resource.
+				if not last:
+					return None
+				length = int(last)
+				if length <= 0 or size == 0:
+					continue
+				ranges.append((max(size - length, 0), size - 1))
+				continue
+			
+			first = int(first)
+			if last:
+				last = int(last)
+				if last < first:
+					return None
+			else:
+				last = size - 1
+		except ValueError:
+			return None
+		
+		if first >= size:
+			continue
+		ranges.append((first, min(last, size - 1)))
+	
+	merged = []
+	for first, last in sorted(ranges):
+		if merged and first <= merged[-1][1] + 1:
+			merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+		else:
+			merged.append((first, last))
+	return merged
+
+
+def iter_file_range(f, first, last, block_size=8192):
+	"""Yields the bytes of the file-like object ``f`` from position ``first`` through position ``last`` (inclusive) in blocks of at most ``block_size`` bytes."""
+	f.seek(first)
+	remaining = last - first + 1
+	while remaining > 0:
+		data = f.read(min(block_size, remaining))
+		if not data:
+			break
+		remaining -= len(data)
+		yield data
+
+
+def accepts_mime_type(accept, mime_type):
+	"""Returns ``True`` if the raw Accept header ``accept`` names ``mime_type`` or a wildcard which covers it. Quality values are not taken into account."""
+	return mime_type in accept or "*/*" in accept or "%s/*" % mime_type.split("/")[0] in accept
+
+
+def negotiate_mime_type(accept, offered, preferred=None):
+	"""
+	Chooses the mime type which should be served to a client that sent the Accept header ``accept``. Results are cached in :data:`accept_cache`, so each distinct header is only examined once per process for a given set of mime types.
+	
+	:param accept: The raw value of the Accept header, or ``None`` if the header was not sent.
+	:param offered: A tuple of the mime types which can be served.
+	:param preferred: A mime type which will be chosen whenever the client accepts it at all, even if one of the ``offered`` types would be a better match.
+	:returns: The chosen mime type, or ``None`` if the client accepts none of the available types.
+	
+	If `mimeparse <http://code.google.com/p/mimeparse/>`_ is installed, it will be used to select the best of the ``offered`` types; otherwise, the first ``offered`` type that is accepted will be selected.
+	
+	"""
+	if not accept:
+		if preferred is not None:
+			return preferred
+		return offered[0] if offered else None
+	
+	key = (accept, offered, preferred)
+	result = accept_cache.get(key)
+	if result is not None:
+		return result[0]
+	
+	if preferred is not None and accepts_mime_type(accept, preferred):
+		mime_type = preferred
+	elif mimeparse and offered:
+		mime_type = mimeparse.best_match(offered, accept) or None
+	else:
+		mime_type = None
+		for mt in offered:
+			if accepts_mime_type(accept, mt):
+				mime_type = mt
+				break
+	
+	# The result is wrapped so that a cached ``None`` can be told apart from a miss.
+	accept_cache.set(key, (mime_type,))
+	return mime_type
@@ -43,6 +43,8 @@ class Registry(object):
 	
 	def __init__(self):
 		self._registry = {}
+		#: Incremented whenever an object is registered or unregistered, so that data derived from the registry can tell when it needs to be rebuilt.
+		self.version = 0
 	
 	def register(self, obj, slug=None, verbose_name=None):
 		"""
@@ -73,6 +75,7 @@ class Registry(object):
 				'obj': obj,
 				'verbose_name': verbose_name
 			}
+			self.version += 1
 	
 	def unregister(self, obj, slug=None):
 		"""
@@ -87,12 +90,14 @@ class Registry(object):
 			if slug in self._registry:
 				if self._registry[slug]['obj'] == obj:
 					del self._registry[slug]
+					self.version += 1
 				else:
 					raise RegistrationError(u"`%s` is not registered as `%s`" % (obj, slug))
 		else:
 			for slug, reg in self.items():
 				if obj == reg:
 					del self._registry[slug]
+					self.version += 1
 	
 	def items(self):
 		"""Returns a list of (slug, obj) items in the registry."""